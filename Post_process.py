@@ -4,12 +4,23 @@ import math
 from pathlib import Path
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure # no pyplot: figures are drawn on the analysis thread, off the GUI backend
+
+import tracks as trk
 
 # CSV and Excel Collums
 REQ_COLS = ["frame","disk_id","cx_mm","cy_mm","mx_mm","my_mm","r_px"]
 
 # Helpers
+def _load_tracks(tracks_path) -> pd.DataFrame:
+    # disk_tracks.csv or the typed disk_tracks.npz (read directly, no text parsing)
+    df = trk.read_tracks(tracks_path)
+    missing = [c for c in REQ_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Track file missing columns: {missing}")
+    return df
+
+
 def _ensure_sorted(df: pd.DataFrame) -> pd.DataFrame:
     return df.sort_values("frame").reset_index(drop=True)
 
@@ -171,17 +182,10 @@ def visualize_trajectories(
     show_title: bool = True,
 ) -> int:
     """
-    Open the CSV and produce a trajectory image with the collision frame highlighted.
+    Open the tracks (CSV or .npz) and produce a trajectory image with the collision frame highlighted.
     Returns the collision frame (int).
     """
-    csvp = Path(csv_path)
-    if not csvp.exists():
-        raise FileNotFoundError(csvp.resolve())
-
-    df = pd.read_csv(csvp)
-    missing = [c for c in REQ_COLS if c not in df.columns]
-    if missing:
-        raise ValueError(f"CSV missing columns: {missing}")
+    df = _load_tracks(csv_path)
 
     df0 = _ensure_sorted(df[df["disk_id"]==0].copy())
     df1 = _ensure_sorted(df[df["disk_id"]==1].copy())
@@ -193,7 +197,8 @@ def visualize_trajectories(
     p0 = df0m.loc[df0m["frame"]==cf, ["cx","cy"]].head(1)
     p1 = df1m.loc[df1m["frame"]==cf, ["cx","cy"]].head(1)
 
-    fig, ax = plt.subplots(figsize=(8, 6))
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
     ax.plot(df0m["cx"], df0m["cy"], label="disk 0 trajectory")
     ax.plot(df1m["cx"], df1m["cy"], label="disk 1 trajectory")
 
@@ -217,10 +222,31 @@ def visualize_trajectories(
     outp.parent.mkdir(parents=True, exist_ok=True)
     fig.tight_layout()
     fig.savefig(outp, dpi=200)
-    plt.close(fig)
 
     return cf
 
+def collision_frame(csv_path: str) -> int:
+    """
+    Collision frame (minimal center-to-center distance) of a disk_tracks CSV or .npz.
+    """
+    df = _load_tracks(csv_path)
+
+    df0m = _add_meter_cols(_ensure_sorted(df[df["disk_id"]==0].copy()))
+    df1m = _add_meter_cols(_ensure_sorted(df[df["disk_id"]==1].copy()))
+    return _find_collision_frame(df0m, df1m)
+
+def collision_metrics(csv_path: str, masses: tuple, radius: tuple, fps: float = 30.0) -> dict:
+    """
+    Results of a disk_tracks CSV or .npz without writing the Excel:
+    collision_frame, restitution_e, momentum_error_rel, energy_drop_rel_COM.
+    """
+    df = _load_tracks(csv_path)
+
+    df0m = _compute_vels(_add_meter_cols(_ensure_sorted(df[df["disk_id"]==0].copy())), fps=fps)
+    df1m = _compute_vels(_add_meter_cols(_ensure_sorted(df[df["disk_id"]==1].copy())), fps=fps)
+    return _compute_metrics(df0m, df1m, masses, radius, fps=fps)
+
+
 def build_student_excel(
     csv_path: str,
     output_xlsx_path: str,
@@ -236,16 +262,11 @@ def build_student_excel(
         - x_m, y_m (meters, centers)
         - theta_deg (unwrapped; marker-to-center angle)
 
+    csv_path may also be the typed disk_tracks.npz.
     If include_metrics=True, adds a "Results" sheet with restitution, momentum error, COM energy drop.
     Returns the collision frame (int).
     """
-    csvp = Path(csv_path)
-    if not csvp.exists():
-        raise FileNotFoundError(csvp.resolve())
-    df = pd.read_csv(csvp)
-    missing = [c for c in REQ_COLS if c not in df.columns]
-    if missing:
-        raise ValueError(f"CSV missing columns: {missing}")
+    df = _load_tracks(csv_path)
 
     df0_raw = _ensure_sorted(df[df["disk_id"]==0].copy())
     df1_raw = _ensure_sorted(df[df["disk_id"]==1].copy())
@@ -5,19 +5,141 @@ Function based aproach
 '''
 
 import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Union, List, Dict, Optional
 
 import cv2
 import numpy as np
 
 
+class ProcessingContext:
+    """
+    Reusable per-frame state for the detection hot loop: uint8 work buffers
+    (written through OpenCV's dst= outputs), structuring elements, the CLAHE
+    instance and circular disk stencils per radius.
+
+    One buffer per name, sized for the largest shape asked so far; callers get
+    a view of its top-left corner (buf[:h, :w]), so window/ROI sizes changing
+    every frame (radius jitter, border clipping) reuse the same memory. The
+    full-frame buffers are allocated up front when `frame_shape` is given.
+    With reuse=False nothing is cached, which is what the functions use when
+    no context is passed.
+    """
+    def __init__(
+        self,
+        frame_shape: Optional[Tuple[int, ...]] = None,
+        reuse: bool = True,
+    ):
+        self.reuse = reuse
+        self._buffers = {} # name -> largest np.ndarray requested under that name
+        self._kernels = {} # (w, h) -> elliptic structuring element
+        self._stencils = {} # radius -> filled circle of side 2r+1
+        self._clahe = None
+
+        if frame_shape is not None and reuse:
+            h, w = frame_shape[:2]
+            self.buffer("diff", (h, w, 3))
+            for name in ("gray", "mask", "clean"):
+                self.buffer(name, (h, w))
+
+    def buffer(self, name: str, shape: Tuple[int, ...]) -> Optional[np.ndarray]:
+        # Preallocated uint8 array, or None (OpenCV then allocates) when not reusing
+        if not self.reuse:
+            return None
+        shape = tuple(int(n) for n in shape)
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape[2:] != shape[2:]:
+            buf = self._buffers[name] = np.empty(shape, dtype=np.uint8)
+        elif buf.shape[0] < shape[0] or buf.shape[1] < shape[1]:
+            # Grow (rare): never below the previous size and with some slack, so it settles quickly
+            size = (max(buf.shape[0], shape[0] + 32), max(buf.shape[1], shape[1] + 32))
+            buf = self._buffers[name] = np.empty(size + shape[2:], dtype=np.uint8)
+        return buf[:shape[0], :shape[1]]
+
+    def kernel(self, size: Tuple[int, int]) -> np.ndarray:
+        size = (int(size[0]), int(size[1]))
+        if not self.reuse:
+            return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, size)
+        if size not in self._kernels:
+            self._kernels[size] = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, size)
+        return self._kernels[size]
+
+    def clahe(self):
+        # Perform CLAHE contrast enhancement (clip 2.0, 8x8 tiles)
+        if not self.reuse:
+            return cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        if self._clahe is None:
+            self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        return self._clahe
+
+    def disk_stencil(self, radius: int) -> np.ndarray:
+        # Same pixels as cv2.circle(..., radius, 255, -1) centred in a (2r+1)² square
+        radius = int(radius)
+        stencil = self._stencils.get(radius) if self.reuse else None
+        if stencil is None:
+            stencil = np.zeros((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+            cv2.circle(stencil, (radius, radius), radius, 255, -1)
+            if self.reuse:
+                self._stencils[radius] = stencil
+        return stencil
+
+
+_NO_CONTEXT = ProcessingContext(reuse=False)
+
+
+class MarkerColorLUT:
+    """
+    Lookup table from quantised BGR (`bits` per channel) straight to a marker
+    class label, built once from HSV ranges: every bin centre is converted to
+    HSV and tested against the ranges. Applying it to a BGR ROI is a single
+    table gather — no HSV conversion or CLAHE per ROI. CLAHE depends on the
+    neighbourhood and can't be tabulated, so the labels only match the HSV
+    path where the enhancement leaves V on the same side of the ranges.
+
+    Labels: 0 = no marker, i+1 = names[i]. On overlapping ranges the earlier
+    colour wins (same as detect_marker).
+    """
+    def __init__(self, color_ranges: Dict[str, Tuple[np.ndarray, np.ndarray]], bits: int = 8):
+        if not 1 <= bits <= 8:
+            raise ValueError(f"LUT bits per channel must be in [1, 8] ({bits}).")
+        self.names = list(color_ranges)
+        self.bits = bits
+
+        # Bin centres of every quantised BGR triplet, as a (N, 1, 3) image
+        shift = 8 - bits
+        centres = (np.arange(1 << bits, dtype=np.uint16) << shift) + ((1 << shift) >> 1)
+        b, g, r = np.meshgrid(centres, centres, centres, indexing="ij")
+        bgr = np.stack((b, g, r), axis=-1).reshape(-1, 1, 3).astype(np.uint8)
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+
+        self.table = np.zeros(bgr.shape[0], dtype=np.uint8)
+        for i in reversed(range(len(self.names))):
+            lower, upper = color_ranges[self.names[i]]
+            self.table[cv2.inRange(hsv, lower, upper).ravel() > 0] = i + 1
+
+    def classify(self, bgr: np.ndarray) -> np.ndarray:
+        # (H, W, 3) uint8 BGR -> (H, W) uint8 labels
+        shift = 8 - self.bits
+        q = bgr >> shift if shift else bgr
+        index = q[..., 0].astype(np.int32) << (2 * self.bits)
+        index |= q[..., 1].astype(np.int32) << self.bits
+        index |= q[..., 2]
+        return self.table[index]
+
+
 def estimate_background_median(
     video_path: str,
     clean_seconds: float,
     frame_sample_limit: int = 50,
     blur_kernel: Tuple[int, int] = (5, 5),
     output_path: str = "table_background.png",
-    return_image: bool = False
+    return_image: bool = False,
+    sampling: str = "seek",
+    estimator: str = "stack",
+    tile_rows: int = 64,
+    workers: int = 1
 ) -> Union[str, Tuple[str, np.ndarray]]:
     
     """
@@ -25,6 +147,19 @@ def estimate_background_median(
     of up to `frame_sample_limit` frames sampled evenly over the first
     `clean_seconds` of the video.
 
+    Two sampling modes are available:
+      - "seek":       jump to every sample index with CAP_PROP_POS_FRAMES.
+      - "sequential": walk the clean interval once with grab() and only
+                      retrieve() (decode to BGR) the sampled frames. No seeks,
+                      which is much cheaper on long-GOP codecs such as mp4v.
+
+    And two median estimators, both giving the exact same image:
+      - "stack":     np.median over the stacked frames (memory grows with the
+                     number of samples and is promoted to float64).
+      - "histogram": samples are spilled to a temporary uint8 file and the
+                     median is selected per pixel from uint16 counts, row tile
+                     by row tile, so RAM stays bounded for any sample count.
+
     Args:
         video_path:         Path to the input video file.
         clean_seconds:      Duration (in seconds) from the start of the video
@@ -34,6 +169,10 @@ def estimate_background_median(
                             Set to None to disable blurring.
         output_path:        Where to save the background image.
         return_image:       If True, also return the background array.
+        sampling:           "seek" or "sequential" (see above).
+        estimator:          "stack" or "histogram" (see above).
+        tile_rows:          Image rows per tile for the "histogram" estimator.
+        workers:            Threads sharing the tiles of the "histogram" estimator.
 
     Returns:
         If return_image is False:
@@ -64,36 +203,31 @@ def estimate_background_median(
 
     num_samples = min(frame_sample_limit, max_clean_frames)
 
+    if sampling not in ("seek", "sequential"):
+        cap.release()
+        raise ValueError(f"Unknown sampling mode ({sampling}).")
+
+    if estimator not in ("stack", "histogram"):
+        cap.release()
+        raise ValueError(f"Unknown median estimator ({estimator}).")
+
 
-    # 2) Sample frames evenly
+    # 2) Sample frames evenly and 3) compute median background
     frame_indices = np.linspace(0, max_clean_frames - 1, num_samples, dtype=int)
-    frames = []
-    for idx in frame_indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
-        ret, frame = cap.read()
-        if ret:
-            
-            # Apply Gaussian Blur to every frame
-            if blur_kernel is not None:
-                kx, ky = blur_kernel
-                frame_blured = cv2.GaussianBlur(frame, (kx, ky), 0)
-                frames.append(frame_blured)
-            
-            else:
-                frames.append(frame)
-            
-    cap.release()
-
-    if not frames:
+    try:
+        n_read, bg_median = median_background(
+            _iter_sampled_frames(cap, frame_indices, sampling),
+            num_samples, blur_kernel, estimator, tile_rows, workers
+        )
+    finally:
+        cap.release()
+
+    if n_read == 0:
         raise RuntimeError("No frames read for background estimation.")
 
-    if len(frames) < num_samples:
+    if n_read < num_samples:
         # Warning: Not fatal, but suggests another try of the experiment
-        print(f"Warning: only {len(frames)} / {num_samples} frames were read.") 
-
-    
-    # 3) Compute median background ---
-    bg_median = np.median(np.stack(frames, axis=0), axis=0).astype(np.uint8)
+        print(f"Warning: only {n_read} / {num_samples} frames were read.") 
 
     # 4) Save to disk (making dirs if needed) ---
     out_dir = os.path.dirname(output_path)
@@ -110,6 +244,195 @@ def estimate_background_median(
     return output_path
 
 
+def median_background(
+    frames,
+    max_samples: int,
+    blur_kernel: Optional[Tuple[int, int]] = (5, 5),
+    estimator: str = "histogram",
+    tile_rows: int = 64,
+    workers: int = 1
+) -> Tuple[int, Optional[np.ndarray]]:
+    """
+    Per-pixel median of an iterable of BGR frames (e.g. sampled from a file, or
+    taken from a live camera stream), each blurred with `blur_kernel` first.
+
+    Args:
+        frames:      Iterable of uint8 frames (consumed once, at most `max_samples` used).
+        max_samples: Upper bound on the number of frames (sizes the "histogram" counts).
+        blur_kernel: Gaussian blur kernel size, None disables blurring.
+        estimator:   "stack" or "histogram" (see estimate_background_median).
+        tile_rows:   Image rows per tile for the "histogram" estimator.
+        workers:     Threads sharing the tiles of the "histogram" estimator.
+
+    Returns:
+        (number_of_frames_used, median_image) — the image is None if no frame was given.
+    """
+    if estimator not in ("stack", "histogram"):
+        raise ValueError(f"Unknown median estimator ({estimator}).")
+
+    samples = (_blur_sample(frame, blur_kernel) for _, frame in zip(range(max_samples), frames))
+    if estimator == "histogram":
+        return _histogram_median(samples, max_samples, tile_rows, workers)
+
+    stack = list(samples)
+    if not stack:
+        return 0, None
+    return len(stack), np.median(np.stack(stack, axis=0), axis=0).astype(np.uint8)
+
+
+def _iter_sampled_frames(cap: cv2.VideoCapture, frame_indices: np.ndarray, sampling: str):
+    """
+    Yield the frames at `frame_indices` (sorted, may repeat) from an open capture.
+    "seek" positions the capture for every index, "sequential" grabs every frame
+    up to the last index and decodes only the wanted ones.
+    """
+    if sampling == "seek":
+        for idx in frame_indices:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ret, frame = cap.read()
+            if ret:
+                yield frame
+        return
+
+    # Sequential: one forward pass, grab() demuxes/decodes, retrieve() only when sampled
+    wanted = np.bincount(frame_indices) # how many times each index was requested
+    for idx in range(len(wanted)):
+        if not cap.grab():
+            break
+        if wanted[idx] == 0:
+            continue
+        ret, frame = cap.retrieve()
+        if not ret:
+            continue
+        for _ in range(int(wanted[idx])):
+            yield frame
+
+
+def _blur_sample(frame: np.ndarray, blur_kernel: Optional[Tuple[int, int]]) -> np.ndarray:
+    # Apply Gaussian Blur to every sampled frame (None disables it)
+    if blur_kernel is None:
+        return frame
+    kx, ky = blur_kernel
+    return cv2.GaussianBlur(frame, (kx, ky), 0)
+
+
+def _histogram_median(samples, max_samples: int, tile_rows: int = 64, workers: int = 1):
+    """
+    Exact per-pixel median of a stream of uint8 frames with bounded memory.
+
+    Frames are spilled to a temporary file (disk, not RAM). For every tile of
+    `tile_rows` rows the lower and upper middle order statistics are found by a
+    bitwise radix select on uint16 per-pixel counts, reading one frame's rows at
+    a time, and averaged with the same truncation as np.median(...).astype(np.uint8).
+
+    Returns:
+      (number_of_frames_read, median_image) — the image is None if no frame was read.
+    """
+    with tempfile.TemporaryFile() as spill:
+        shape = None
+        n = 0
+        for frame in samples:
+            if n == max_samples:
+                break
+            if shape is None:
+                shape = frame.shape
+            spill.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+            n += 1
+        if n == 0:
+            return 0, None
+        spill.flush()
+
+        height = shape[0]
+        row_bytes = int(np.prod(shape[1:]))
+        frame_bytes = height * row_bytes
+        bg = np.empty(shape, dtype=np.uint8)
+        rank_lo, rank_hi = (n - 1) // 2, n // 2
+        lock = threading.Lock()
+
+        def read_rows(idx, r0, out):
+            # One frame's rows [r0, r0 + len(out)) from the spill file
+            with lock:
+                spill.seek(idx * frame_bytes + r0 * row_bytes)
+                spill.readinto(memoryview(out).cast("B"))
+
+        def run_tile(r0):
+            r1 = min(r0 + tile_rows, height)
+            lo, hi = _radix_select(read_rows, n, r0, (r1 - r0,) + shape[1:], rank_lo, rank_hi)
+            # (lo + hi) // 2 without overflow == truncated float mean
+            bg[r0:r1] = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+
+        tiles = range(0, height, max(1, int(tile_rows)))
+        if workers and workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(run_tile, tiles))
+        else:
+            for r0 in tiles:
+                run_tile(r0)
+
+    return n, bg
+
+
+def _radix_select(read_rows, n: int, r0: int, shape: Tuple[int, ...], rank_lo: int, rank_hi: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-pixel order statistics `rank_lo` and `rank_hi` over `n` frames of a tile.
+    Builds each answer bit by bit (MSB first): a bit is kept when at most `rank`
+    samples lie strictly below the candidate value.
+    """
+    lo = np.zeros(shape, dtype=np.uint8)
+    hi = np.zeros(shape, dtype=np.uint8)
+    count_lo = np.empty(shape, dtype=np.uint16)
+    count_hi = np.empty(shape, dtype=np.uint16)
+    below = np.empty(shape, dtype=bool)
+    rows = np.empty(shape, dtype=np.uint8)
+    same = rank_lo == rank_hi
+
+    for bit in (128, 64, 32, 16, 8, 4, 2, 1):
+        cand_lo = lo | bit
+        cand_hi = cand_lo if same else hi | bit
+        count_lo.fill(0)
+        count_hi.fill(0)
+        for idx in range(n):
+            read_rows(idx, r0, rows)
+            np.less(rows, cand_lo, out=below)
+            count_lo += below
+            if not same:
+                np.less(rows, cand_hi, out=below)
+                count_hi += below
+        np.copyto(lo, cand_lo, where=count_lo <= rank_lo)
+        if not same:
+            np.copyto(hi, cand_hi, where=count_hi <= rank_hi)
+
+    return lo, (lo if same else hi)
+
+
+def motion_thumbnail(frame: np.ndarray, width: int = 160) -> np.ndarray:
+    """
+    Small blurred grayscale copy of a frame for motion checks (INTER_AREA
+    averages the sensor noise away; ~2 ms for a 1080p frame).
+
+    Args:
+        frame: BGR (or grayscale) uint8 frame.
+        width: Thumbnail width in pixels (height keeps the aspect ratio).
+
+    Returns:
+        uint8 grayscale thumbnail.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    h, w = gray.shape[:2]
+    small = cv2.resize(gray, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (3, 3), 0)
+
+
+def motion_energy(thumb: np.ndarray, prev_thumb: np.ndarray, diff_thresh: int = 12) -> float:
+    """
+    Fraction of thumbnail pixels that changed by more than `diff_thresh` grey
+    levels between two motion_thumbnail() frames (0 on a still table, ~1% for
+    one sliding disk).
+    """
+    diff = cv2.absdiff(thumb, prev_thumb)
+    return cv2.countNonZero(cv2.threshold(diff, diff_thresh, 255, cv2.THRESH_BINARY)[1]) / diff.size
+
+
 def segment_disks(  
     frame: np.ndarray,
     background: np.ndarray, # Computed earlier on estimate_background_median
@@ -117,6 +440,7 @@ def segment_disks(
     morph_kernel: Tuple[int, int] = (5, 5),
     min_radius: float = 45,
     max_radius: float = 65,
+    ctx: Optional[ProcessingContext] = None,
 ) -> List[Dict]:
     """
     Subtracts `background` from `frame`, thresholds the difference, cleans it up,
@@ -129,6 +453,7 @@ def segment_disks(
       morph_kernel:  Kernel size for morphological open to remove noise.
       min_radius:    Discard detections smaller than this radius [px].
       max_radius:    Discard detections larger than this radius [px].
+      ctx:           Optional ProcessingContext with reusable buffers/kernels.
 
     Returns:
       A list of dicts, each with:
@@ -136,25 +461,192 @@ def segment_disks(
         - "center":  (float x, float y)
         - "radius":  float radius in pixels
     """
-    # 1) Background subtraction → gray diff
-    diff = cv2.absdiff(frame, background)
-    gray = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
+    # 1-3) Foreground mask, 4) contours, 5) radius/circularity filter
+    clean = _foreground_mask(frame, background, thresh_val, morph_kernel, ctx)
+    contours, _ = cv2.findContours(
+        clean, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+    return _filter_disks(contours, min_radius, max_radius)
 
-    # 2) Threshold using a manual 'optimal' value    
-    _, bin_mask = cv2.threshold(gray, thresh_val, 255, cv2.THRESH_BINARY)
 
+def segment_disks_roi(
+    frame: np.ndarray,
+    background: np.ndarray,
+    predictions: List[Tuple[float, float, float]],
+    thresh_val: Union[int, float] = 50,
+    morph_kernel: Tuple[int, int] = (5, 5),
+    min_radius: float = 45,
+    max_radius: float = 65,
+    pad_factor: float = 2.0,
+    ctx: Optional[ProcessingContext] = None,
+) -> Optional[List[Dict]]:
+    """
+    Same pipeline as segment_disks, but only inside padded windows around the
+    positions predicted by the tracker (overlapping windows are merged).
 
-    # 3) Morphological open then close to clean and fill any holes or clear any specles
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, morph_kernel)
-    clean = cv2.morphologyEx(bin_mask, cv2.MORPH_OPEN, kernel)
-    clean = cv2.morphologyEx(clean, cv2.MORPH_CLOSE, kernel)
+    Args:
+      frame, background, thresh_val, morph_kernel, min_radius, max_radius, ctx:
+                     As in segment_disks.
+      predictions:   List of predicted (x, y, radius) in pixels, one per tracked disk.
+      pad_factor:    Window half-size as a multiple of the predicted radius.
 
-    # 4) Find contours
-    contours, _ = cv2.findContours(
-        clean, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    Returns:
+      The disks found (same dicts as segment_disks, full-frame coordinates), or
+      None when the windows can't be trusted — fewer disks than predictions or a
+      disk cut by a window border — so the caller falls back to segment_disks.
+    """
+    if not predictions:
+        return None
+
+    h, w = frame.shape[:2]
+    windows = []
+    for x, y, r in predictions:
+        pad = int(r * pad_factor) + 1
+        x1, y1 = max(int(x) - pad, 0), max(int(y) - pad, 0)
+        x2, y2 = min(int(x) + pad, w), min(int(y) + pad, h)
+        if x2 > x1 and y2 > y1:
+            windows.append([x1, y1, x2, y2])
+    windows = _merge_windows(windows)
+
+    disks = []
+    for x1, y1, x2, y2 in windows:
+        clean = _foreground_mask(frame[y1:y2, x1:x2], background[y1:y2, x1:x2], thresh_val, morph_kernel, ctx)
+        contours, _ = cv2.findContours(
+            clean, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x1, y1)
+        )
+        for d in _filter_disks(contours, min_radius, max_radius):
+            # A disk touching an inner window border may be truncated
+            bx, by, bw, bh = cv2.boundingRect(d["contour"])
+            if (x1 > 0 and bx <= x1) or (y1 > 0 and by <= y1) \
+                    or (x2 < w and bx + bw >= x2) or (y2 < h and by + bh >= y2):
+                return None
+            disks.append(d)
+
+    if len(disks) < len(predictions):
+        return None
+    return disks
+
+
+def segment_disks_pyramid(
+    frame: np.ndarray,
+    background: np.ndarray,
+    scale: float = 0.5,
+    thresh_val: Union[int, float] = 50,
+    morph_kernel: Tuple[int, int] = (5, 5),
+    min_radius: float = 45,
+    max_radius: float = 65,
+    background_small: Optional[np.ndarray] = None,
+    refine_pad: float = 1.3,
+    ctx: Optional[ProcessingContext] = None,
+    coarse_circularity: float = 0.4,
+) -> List[Dict]:
+    """
+    Coarse-to-fine segment_disks: threshold and find contours on a frame
+    downscaled by `scale`, then refine every candidate's center and radius at
+    full resolution inside a small window around it (segment_disks_roi).
+    Falls back to a full-resolution segment_disks if the refinement fails.
+
+    Args:
+      frame, background, thresh_val, morph_kernel, min_radius, max_radius, ctx:
+                        As in segment_disks (full-resolution values).
+      scale:            Downscale factor of the coarse level (0 < scale <= 1).
+      background_small: Background already resized by `scale` (avoids a resize
+                        per frame); computed here when None.
+      refine_pad:       Refinement window half-size in coarse radii.
+      coarse_circularity: Circularity a coarse candidate needs (blobs touching
+                        the frame edge need none); the full-resolution test
+                        stays at segment_disks' 0.7.
+
+    Returns:
+      Same list of dicts as segment_disks, in full-resolution coordinates.
+    """
+    if not 0 < scale <= 1:
+        raise ValueError(f"Pyramid scale must be in (0, 1] ({scale}).")
+    if scale == 1:
+        return segment_disks(frame, background, thresh_val, morph_kernel, min_radius, max_radius, ctx)
+
+    # 1) Coarse level (kernel and radius limits scaled, with some slack for the resampling)
+    ctx = ctx or _NO_CONTEXT
+    h, w = frame.shape[:2]
+    small_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    small = cv2.resize(frame, small_size, dst=ctx.buffer("small", (small_size[1], small_size[0], 3)),
+                       interpolation=cv2.INTER_LINEAR)
+    if background_small is None or background_small.shape != small.shape:
+        background_small = cv2.resize(background, (small.shape[1], small.shape[0]), interpolation=cv2.INTER_LINEAR)
+    k = max(3, int(round(morph_kernel[0] * scale)) | 1)
+    clean = _foreground_mask(small, background_small, thresh_val, (k, k), ctx)
+    contours, _ = cv2.findContours(clean, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Downscaled (blurred, edge-cut) disks look less circular: loose candidates here, the full-resolution
+    # refinement applies the real test and falls back to segment_disks when a candidate is rejected
+    coarse = _filter_disks(contours, 0.8 * min_radius * scale, 1.2 * max_radius * scale,
+                           min_circularity=coarse_circularity, border=clean.shape[:2])
+    if not coarse:
+        return []
+
+    # 2) Full-resolution refinement around every coarse candidate
+    predictions = [(d["center"][0] / scale, d["center"][1] / scale, d["radius"] / scale) for d in coarse]
+    disks = segment_disks_roi(
+        frame, background, predictions,
+        thresh_val, morph_kernel, min_radius, max_radius,
+        pad_factor=refine_pad, ctx=ctx
     )
+    if disks is None:
+        disks = segment_disks(frame, background, thresh_val, morph_kernel, min_radius, max_radius, ctx)
+    return disks
 
-    # 5) Filter contours based on radious and circularity 
+
+def _merge_windows(windows: List[List[int]]) -> List[List[int]]:
+    # Union overlapping rectangles [x1, y1, x2, y2] until none overlap
+    merged = [list(win) for win in windows]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    merged[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    merged.pop(j)
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def _foreground_mask(
+    frame: np.ndarray,
+    background: np.ndarray,
+    thresh_val: Union[int, float],
+    morph_kernel: Tuple[int, int],
+    ctx: Optional[ProcessingContext] = None,
+) -> np.ndarray:
+    ctx = ctx or _NO_CONTEXT
+    shape = frame.shape[:2]
+
+    # 1) Background subtraction → gray diff
+    diff = cv2.absdiff(frame, background, dst=ctx.buffer("diff", frame.shape))
+    gray = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY, dst=ctx.buffer("gray", shape))
+
+    # 2) Threshold using a manual 'optimal' value    
+    _, bin_mask = cv2.threshold(gray, thresh_val, 255, cv2.THRESH_BINARY, dst=ctx.buffer("mask", shape))
+
+    # 3) Morphological open then close to clean and fill any holes or clear any specles
+    kernel = ctx.kernel(morph_kernel)
+    clean = cv2.morphologyEx(bin_mask, cv2.MORPH_OPEN, kernel, dst=ctx.buffer("clean", shape))
+    clean = cv2.morphologyEx(clean, cv2.MORPH_CLOSE, kernel, dst=bin_mask if ctx.reuse else None)
+    return clean
+
+
+def _filter_disks(
+    contours,
+    min_radius: float,
+    max_radius: float,
+    min_circularity: float = 0.7,
+    border: Optional[Tuple[int, int]] = None,
+) -> List[Dict]:
+    # Keep contours based on radious and circularity 
+    # border: (h, w) of the image --> blobs touching its edge skip the circularity test (coarse candidates only)
     disks = []
     for cnt in contours:
         # First test:  Minimum enclosing circle
@@ -162,13 +654,19 @@ def segment_disks(
         if not (min_radius <= r <= max_radius):
             continue
 
+        if border is not None:
+            bx, by, bw, bh = cv2.boundingRect(cnt)
+            if bx <= 0 or by <= 0 or bx + bw >= border[1] or by + bh >= border[0]:
+                disks.append({"contour": cnt, "center": (x, y), "radius": r})
+                continue
+
         # Second test: Filter by circularity
         area = cv2.contourArea(cnt)
         perimeter = cv2.arcLength(cnt, True)
         if perimeter <= 0:
             continue
         circularity = 4 * np.pi * area / (perimeter * perimeter)
-        if circularity < 0.7:  # Optimize if needed (0.7 seems fine from the tests made)
+        if circularity < min_circularity:  # Optimize if needed (0.7 seems fine from the tests made)
             continue
 
         disks.append({
@@ -187,7 +685,8 @@ def detect_marker_center(
     hsv_lower: np.ndarray,
     hsv_upper: np.ndarray,
     pad_factor: float = 2,
-    min_area: float = 10
+    min_area: float = 10,
+    ctx: Optional[ProcessingContext] = None
 ) -> Optional[Tuple[int, int]]:
     """
     Crop around `disk_center` ± pad_factor×radius, threshold in HSV between
@@ -203,11 +702,112 @@ def detect_marker_center(
       debug:        If True, show debug windows for ROI/masks.
       pad_factor:   How much to pad the ROI around the disk.
       min_area:     Minimum contour area (px²) to accept as the mark.
+      ctx:          Optional ProcessingContext with reusable buffers/kernels/CLAHE.
 
     Returns:
       (x,y) pixel coordinates of the mark's centroid in full frame, or None.
     """
     
+    # 1-2) ROI extraction, blur, HSV with CLAHE-enhanced V, and the inside-disk mask
+    ctx = ctx or _NO_CONTEXT
+    x1, y1, hsv, mask_disk = _marker_roi_hsv(frame, disk_center, disk_radius, pad_factor, ctx)
+    raw_mask = cv2.inRange(hsv, hsv_lower, hsv_upper, dst=ctx.buffer("raw_mask", mask_disk.shape)) 
+
+    # 3) Restrict to inside the disk, 4) blur and morphological cleanup
+    mask = _clean_marker_mask(raw_mask, mask_disk, ctx)
+
+    # 5-7) Largest blob centroid, mapped from ROI ---> full frame
+    blob = _largest_blob(mask, min_area)
+    if blob is None:
+        return None
+    _, (cx, cy) = blob
+    return (cx + x1, cy + y1)
+
+
+def detect_marker(
+    frame: np.ndarray,
+    disk_center: Tuple[float, float],
+    disk_radius: float,
+    color_ranges: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    pad_factor: float = 2,
+    min_area: float = 10,
+    ctx: Optional[ProcessingContext] = None,
+    lut: Optional[MarkerColorLUT] = None
+) -> Optional[Tuple[Tuple[int, int], str]]:
+    """
+    Multi-colour version of detect_marker_center: the ROI is cropped, blurred
+    and converted to CLAHE-enhanced HSV once, every colour of `color_ranges`
+    is written into one label image, and a single cleanup + contour pass runs
+    on the union. Each blob takes the colour most of its pixels have.
+
+    Args:
+      frame, disk_center, disk_radius, pad_factor, min_area, ctx:
+                    As in detect_marker_center.
+      color_ranges: {colour name: (hsv_lower, hsv_upper)}; on overlapping
+                    ranges the earlier colour wins.
+      lut:          Optional MarkerColorLUT built from the same ranges: labels
+                    the blurred BGR ROI directly, skipping HSV and CLAHE. Not
+                    equivalent: markers near the V threshold can change label
+                    where CLAHE would have lifted them.
+
+    Returns:
+      ((x,y) centroid in full frame, colour name) of the largest blob, or None.
+    """
+    ctx = ctx or _NO_CONTEXT
+    if lut is not None:
+        if lut.names != list(color_ranges):
+            raise ValueError(f"Marker LUT built for {lut.names}, not {list(color_ranges)}.")
+        # 1-3) ROI extraction and blur, labels straight from the lookup table
+        x1, y1, roi_blur, mask_disk = _marker_roi(frame, disk_center, disk_radius, pad_factor, ctx)
+        return _classify_marker(lut.classify(roi_blur), lut.names, x1, y1, mask_disk, min_area, ctx)
+
+    # 1-2) ROI extraction, blur, HSV with CLAHE-enhanced V, and the inside-disk mask
+    x1, y1, hsv, mask_disk = _marker_roi_hsv(frame, disk_center, disk_radius, pad_factor, ctx)
+    shape = mask_disk.shape
+    names = list(color_ranges)
+
+    # 3) Label image: 0 = background, i+1 = names[i]
+    labels = ctx.buffer("labels", shape)
+    labels = np.zeros(shape, dtype=np.uint8) if labels is None else labels
+    labels.fill(0)
+    for i, name in enumerate(reversed(names)):
+        lower, upper = color_ranges[name]
+        hit = cv2.inRange(hsv, lower, upper, dst=ctx.buffer("raw_mask", shape))
+        labels[hit > 0] = len(names) - i
+    return _classify_marker(labels, names, x1, y1, mask_disk, min_area, ctx)
+
+
+def _classify_marker(labels, names, x1, y1, mask_disk, min_area, ctx):
+    # One cleanup + contour pass over the union of all colour labels
+    raw_mask = cv2.compare(labels, 0, cv2.CMP_GT, dst=ctx.buffer("raw_mask", labels.shape))
+    mask = _clean_marker_mask(raw_mask, mask_disk, ctx)
+    blob = _largest_blob(mask, min_area)
+    if blob is None:
+        return None
+    marker, (cx, cy) = blob
+
+    # Majority colour inside the blob (pixels of the cleaned mask with no label don't vote)
+    inside = ctx.buffer("blob", labels.shape)
+    inside = np.zeros(labels.shape, dtype=np.uint8) if inside is None else inside
+    inside.fill(0)
+    cv2.drawContours(inside, [marker], -1, 255, -1)
+    votes = np.bincount(labels[inside > 0], minlength=len(names) + 1)[1:]
+    if votes.sum() == 0:
+        return None
+    return (cx + x1, cy + y1), names[int(np.argmax(votes))]
+
+
+def _marker_roi(
+    frame: np.ndarray,
+    disk_center: Tuple[float, float],
+    disk_radius: float,
+    pad_factor: float,
+    ctx: ProcessingContext,
+):
+    """
+    Returns (x1, y1, roi_blur, mask_disk): the ROI's upper-left corner in the
+    frame, the blurred BGR ROI and the filled disk circle in ROI coordinates.
+    """
     # 1) ROI extraction 
     x_c, y_c = map(int, disk_center) # convert pixel values to integers
     pad = int(disk_radius * pad_factor) # compute a reasonable extent for the ROI (padding)
@@ -219,30 +819,55 @@ def detect_marker_center(
     
     roi = frame[y1:y2, x1:x2] # ROI in-frame image
 
-    # 2) Pre‑smooth the ROI to mitigate motion blur, then convert to HSV
-    roi_blur = cv2.GaussianBlur(roi, (5, 5), 0)
-    hsv = cv2.cvtColor(roi_blur, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
+    # 2) Pre‑smooth the ROI to mitigate motion blur
+    roi_blur = cv2.GaussianBlur(roi, (5, 5), 0, dst=ctx.buffer("roi_blur", roi.shape))
+
+    # Inside-the-disk mask in ROI coordinates
+    mask_disk = _disk_mask(roi.shape[:2], (x_c - x1, y_c - y1), int(disk_radius), ctx)
+    return x1, y1, roi_blur, mask_disk
+
+
+def _marker_roi_hsv(
+    frame: np.ndarray,
+    disk_center: Tuple[float, float],
+    disk_radius: float,
+    pad_factor: float,
+    ctx: ProcessingContext,
+):
+    """
+    Returns (x1, y1, hsv, mask_disk): as _marker_roi, with the blurred ROI
+    converted to HSV and its V channel CLAHE-enhanced.
+    """
+    x1, y1, roi_blur, mask_disk = _marker_roi(frame, disk_center, disk_radius, pad_factor, ctx)
+
+    # 2) ... then convert to HSV
+    shape = mask_disk.shape
+    hsv = cv2.cvtColor(roi_blur, cv2.COLOR_BGR2HSV, dst=ctx.buffer("hsv", roi_blur.shape))
+    v = cv2.extractChannel(hsv, 2, dst=ctx.buffer("v", shape))
       
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8)) # Perform CLAHE contrast enhancement
-    v = clahe.apply(v)
-    hsv = cv2.merge((h, s, v)) # merge the new CLAHE enhanced V chanel
-    raw_mask = cv2.inRange(hsv, hsv_lower, hsv_upper) 
+    v = ctx.clahe().apply(v, dst=ctx.buffer("v_eq", shape)) # Perform CLAHE contrast enhancement
+    cv2.insertChannel(v, hsv, 2) # put back the new CLAHE enhanced V chanel
+    return x1, y1, hsv, mask_disk
+
 
+def _clean_marker_mask(raw_mask: np.ndarray, mask_disk: np.ndarray, ctx: ProcessingContext) -> np.ndarray:
     # 3) Restrict to inside the disk
-    center_x = x_c - x1
-    center_y = y_c - y1
-    mask_disk = np.zeros_like(raw_mask)
-    cv2.circle(mask_disk, (center_x, center_y), int(disk_radius), 255, -1)
-    raw_mask = cv2.bitwise_and(raw_mask, mask_disk)
+    shape = raw_mask.shape
+    raw_mask = cv2.bitwise_and(raw_mask, mask_disk, dst=raw_mask if ctx.reuse else None)
     
     # 4) Blur and Morphological Cleanup
-    mask = cv2.medianBlur(raw_mask, 5)
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7,7))
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN,  kernel, iterations=1)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=3)
+    mask = cv2.medianBlur(raw_mask, 5, dst=ctx.buffer("marker_mask", shape))
+    kernel = ctx.kernel((7,7))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN,  kernel, dst=ctx.buffer("marker_open", shape), iterations=1)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, dst=ctx.buffer("marker_mask", shape), iterations=3)
+    return mask
 
 
+def _largest_blob(mask: np.ndarray, min_area: float):
+    """
+    Largest external contour of `mask` with area >= min_area and its integer
+    centroid (ROI coordinates), or None.
+    """
     # 5) Find Contours --> as seen already on segment_disks()
     contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     if not contours:
@@ -258,7 +883,29 @@ def detect_marker_center(
     if M["m00"] == 0:
         return None
 
-    # 7 Map centroid positions from ROI ---> full frame
-    cx = int(M["m10"] / M["m00"]) + x1
-    cy = int(M["m01"] / M["m00"]) + y1
-    return (cx, cy)
\ No newline at end of file
+    # 7 Centroid in ROI coordinates
+    return marker, (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+
+
+def _disk_mask(
+    shape: Tuple[int, int],
+    center: Tuple[int, int],
+    radius: int,
+    ctx: ProcessingContext,
+) -> np.ndarray:
+    # Filled circle of `radius` at `center` on a zero image of `shape`, pasted from a cached stencil
+    mask = ctx.buffer("disk_mask", shape)
+    if mask is None:
+        mask = np.zeros(shape, dtype=np.uint8)
+    else:
+        mask.fill(0)
+    stencil = ctx.disk_stencil(radius)
+
+    h, w = shape
+    cx, cy = center
+    x1, y1 = max(cx - radius, 0), max(cy - radius, 0)
+    x2, y2 = min(cx + radius + 1, w), min(cy + radius + 1, h)
+    if x2 > x1 and y2 > y1:
+        sx, sy = x1 - (cx - radius), y1 - (cy - radius)
+        mask[y1:y2, x1:x2] = stencil[sy:sy + (y2 - y1), sx:sx + (x2 - x1)]
+    return mask
@@ -0,0 +1,120 @@
+'''
+Active interval index
+Cheap motion-energy pass over a recording (grey thumbnails, no segmentation)
+that finds where the disks actually move. Saved next to the video and keyed
+by its content hash, so detector.main (TRIM_IDLE) can skip the idle frames
+before and after the collision; the clean background interval at the start of
+the file is never touched
+
+'''
+
+import hashlib
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import Pre_process as prp
+import background_cache as bgc
+
+
+INDEX_VERSION = 1 # bump when the motion pass changes its output
+THUMB_WIDTH = 160 # motion thumbnail width in pixels
+STRIDE = 2 # thumbnails of one frame out of STRIDE (motion measured over STRIDE frames)
+THRESHOLD = 0.002 # fraction of changed thumbnail pixels counted as motion (one sliding disk ~0.01)
+MIN_ACTIVE = 3 # consecutive moving samples needed (ignores single-frame flicker)
+
+
+def motion_profile(video_path, stride: int = STRIDE, width: int = THUMB_WIDTH, tick=None):
+    """
+    Motion energy of a recording: every frame is grabbed, one out of `stride`
+    is decoded to a motion thumbnail and compared with the previous one.
+    tick: called once per frame (progress/cancellation).
+    returns: (frame index of every sample, energy of every sample, frames read)
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    idx, energy = [], []
+    prev = None
+    frame_idx = 0
+    try:
+        while cap.grab():
+            if frame_idx % stride == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                thumb = prp.motion_thumbnail(frame, width)
+                idx.append(frame_idx)
+                energy.append(0.0 if prev is None else prp.motion_energy(thumb, prev))
+                prev = thumb
+            if tick is not None:
+                tick()
+            frame_idx += 1
+    finally:
+        cap.release()
+    return np.asarray(idx, dtype=int), np.asarray(energy, dtype=float), frame_idx
+
+
+def active_interval(idx, energy, n_frames: int, margin: int, threshold: float = THRESHOLD, min_active: int = MIN_ACTIVE):
+    """
+    First to last run of >= `min_active` moving samples, widened by `margin`
+    frames on each side. Idle stretches between two motions are kept (the
+    trackers need continuous frames).
+    returns: (start, stop) frame range, or None if nothing moved
+    """
+    moving = energy > threshold
+    runs = []
+    i = 0
+    while i < len(moving):
+        if moving[i]:
+            j = i
+            while j < len(moving) and moving[j]:
+                j += 1
+            if j - i >= min_active:
+                runs.append((i, j - 1))
+            i = j
+        else:
+            i += 1
+    if not runs:
+        return None
+    # A sample measures the motion since the previous sample
+    first = idx[max(runs[0][0] - 1, 0)]
+    last = idx[runs[-1][1]]
+    return int(max(first - margin, 0)), int(min(last + margin + 1, n_frames))
+
+
+def _index_path(video_path) -> Path:
+    p = Path(video_path)
+    return p.with_name(f"{p.stem}_active.json")
+
+
+def load_index(video_path, fps: float, margin_s: float, tick=None) -> dict:
+    """
+    Active interval of `video_path` from its sidecar (<stem>_active.json) when
+    the video and parameters match, else from a new motion pass (saved).
+    returns: {"start", "stop", "frames", "key"}; start/stop are None if nothing moved
+    """
+    margin = int(round(margin_s * fps))
+    params = {
+        "version": INDEX_VERSION,
+        "video": bgc.video_fingerprint(video_path),
+        "stride": STRIDE, "width": THUMB_WIDTH,
+        "threshold": THRESHOLD, "min_active": MIN_ACTIVE, "margin": margin,
+    }
+    key = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=16).hexdigest()
+    path = _index_path(video_path)
+    try:
+        stored = json.loads(path.read_text())
+    except (OSError, ValueError):
+        stored = None
+    if stored is not None and stored.get("key") == key:
+        return stored
+
+    idx, energy, n_read = motion_profile(video_path, tick=tick)
+    interval = active_interval(idx, energy, n_read, margin)
+    start, stop = interval if interval is not None else (None, None)
+    index = {"start": start, "stop": stop, "frames": n_read, "key": key}
+    path.write_text(json.dumps(index, indent=2))
+    return index
@@ -1,10 +1,12 @@
 # Default Imports from PySide6 and the Qt framework
+import json
 import sys
+import threading
 import time
 from PyQt6 import uic
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize
+from PyQt6.QtCore import QThread, pyqtSignal, QSize
 from PyQt6.QtGui import QImage, QPixmap
-from PyQt6.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton, QStackedWidget, QLineEdit, QStatusBar 
+from PyQt6.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton, QStackedWidget, QLineEdit, QStatusBar, QProgressBar
 from pathlib import Path
 
 # Block Warnings from MSMF
@@ -20,8 +22,29 @@ except Exception:
 
 # Personal Imports for wiring navigation
 import helper as hp
+import detector as dtc
+import Pre_process as prp
+import Post_process as ptp
+import online as onl
+import profiler as prf
+import recorder as rec
 from pathlib import Path
 
+PROGRESS_INTERVAL = 0.1 # seconds between analysis progress signals (keeps the GUI event queue light)
+ONLINE_DETECTION = True # detect disks while recording (online.py) --> tracks ready on Stop
+PRE_TRIGGER = False # Record arms a RAM ring buffer; the file starts PRE_TRIGGER_S before the trigger (motion or Stop)
+PRE_TRIGGER_S = dtc.CLEAN_SECONDS + 1.0 # pre-roll: must hold the clean interval of the still table
+POST_ROLL_S = 2.0 # seconds kept after the last motion (or after Stop)
+MOTION_TRIGGER = True # motion on the table fires the trigger (else only Stop does)
+MOTION_THRESHOLD = 0.002 # fraction of changed thumbnail pixels counted as motion (one sliding disk ~0.01)
+CAMERA_CACHE = Path(os.path.expanduser("~")) / ".collision_study" / "camera.json" # last working camera config per index
+BACKENDS = ('msmf', 'dshow', 'any') # probed concurrently when the cached config fails (then one by one)
+PROBE_TIMEOUTS = {'msmf': (2.5, 0.9), 'dshow': (1.5, 0.7), 'any': (1.2, 0.6)} # seconds: open, first frame (codec.txt); only bound the concurrent round
+PROBE_CONFIGURE_S = 4.0 # extra seconds per attempt for the mode negotiation + black-frame probe
+PROBE_FALLBACK_S = 15.0 # seconds: grace for opens still running after the concurrent round, and per backend one by one
+PREVIEW_FPS = None # live preview rate cap (None = display refresh rate, set by MainWindow)
+PREVIEW_SIZE = (640, 360) # preview size until the GUI reports the label size
+
 
 def resource_path(*parts) -> Path:
     """
@@ -33,10 +56,63 @@ def resource_path(*parts) -> Path:
 
 
 
+class _ProbeRace:
+    # Shared by the backend probe workers: the first viable claim wins, later ones are refused
+    def __init__(self, attempts):
+        self._lock = threading.Lock()
+        self._pending = attempts
+        self.cancel = threading.Event() # set once a winner exists or the probe deadline passed
+        self.done = threading.Event() # winner found or every attempt finished
+        self.winner = None # (backend, cap, ((width, height), fps))
+        self._entries = [] # one report dict per attempt, only touched under the lock
+
+    def claim(self, codec, cap, config) -> bool:
+        with self._lock:
+            if self.cancel.is_set():
+                return False
+            self.winner = (codec, cap, config)
+            self.cancel.set()
+            self.done.set()
+            return True
+
+    def record(self, entry, **fields):
+        # Attempt progress for the report (entry added on its first record)
+        with self._lock:
+            if not any(e is entry for e in self._entries):
+                self._entries.append(entry)
+            entry.update(fields)
+
+    def running(self, codec) -> bool:
+        # Attempt of this backend still blocked in OpenCV
+        with self._lock:
+            return any(e["backend"] == codec and e["result"] == "running" for e in self._entries)
+
+    def abort(self):
+        # stop() while probing: refuse every claim and end the wait
+        with self._lock:
+            self.cancel.set()
+            self.done.set()
+
+    def finished(self):
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self.done.set()
+
+    def close(self):
+        # No claim accepted after this; winner + report snapshot (late attempts keep writing their own dicts)
+        with self._lock:
+            self.cancel.set()
+            return self.winner, [dict(e) for e in self._entries]
+
+
+
 class CameraWorker(QThread):
     ImageUpdate = pyqtSignal(QImage)
     ConfigReady = pyqtSignal(int, int, float, str)
     StatsUpdate = pyqtSignal(float) 
+    RecordingSaved = pyqtSignal(str) # pre-trigger recording closed after its post-roll
+    OnlineFinished = pyqtSignal(dict) # online detection summary of the last recording
 
     def __init__(self, camera_index=0, parent=None):
         # Initialize Class an Object Attrs
@@ -48,14 +124,33 @@ class CameraWorker(QThread):
 
         # Recording State
         self._recording = False
-        self._writer = None
+        self._encoder = None # recorder.FrameEncoder (owns the VideoWriter)
+        self.encoder_stats = None # queued/written/dropped of the last recording
         self._target_fps = None
         self._size = None 
         self._path = None
-
+        self._online = None # online.OnlineDetector of the current recording
+        self._online_finisher = None # thread draining it once the recording stopped
+        self.online_summary = None # its summary once drained
+
+        # Pre-trigger State (only touched by the capture thread once armed)
+        self._trigger_state = None # None, "armed" (ring only) or "triggered" (writing)
+        self._ring = None # recorder.FrameRing with the last PRE_TRIGGER_S
+        self._record_fps = None
+        self._trigger_request = False # set by stop_record() from the GUI
+        self._post_until = 0.0
+        self._motion_prev = None
+        self._still_frames = 0 # still frames in a row since arming (motion triggers after CLEAN_SECONDS)
+
+        self._probe_race = None # _ProbeRace of the round in progress (stop() aborts it)
         self._config_emitted = False
         self._backend_used = 'unknown'
 
+        # Live Preview (own thread: newest frame only, downsized to the label, at most preview_fps)
+        self._preview_box = rec.LatestFrame()
+        self._preview_size = PREVIEW_SIZE # set_preview_size() from the GUI thread
+        self.preview_fps = PREVIEW_FPS or 60.0
+
         # Silence OpenCV WARNS
         try:
             cv2.utils.logging.setLogLevel(cv2.utils.logging.LOG_LEVEL_ERROR)
@@ -80,7 +175,7 @@ class CameraWorker(QThread):
 
 
     def _try_configure(self, cap):
-        # Preferential Record Combos 
+        # Preferential Record Combos --> ((width, height), fps) of the First Accepted, None if no Frame
         prefs = (
             [(1920, 1080, 60), (1280, 720, 60)]
             + [(2560, 1440, 30), (1920, 1080, 30), (1280, 720, 30)]
@@ -98,21 +193,17 @@ class CameraWorker(QThread):
             # Accept if Reasonably Close (USB Cams Often Return Near Values)
             fh, fw = test.shape[:2]
             if abs(fw - w) <= 32 and abs(fh - h) <= 32:
-                self._size = (fw, fh)
-                self._target_fps = float(fps)
-                return True
+                return (fw, fh), float(fps)
 
         # Fallback: Whatever is avaiable from the Camera
         ok, test = cap.read()
         if ok and test is not None:
             fh, fw = test.shape[:2]
-            self._size = (fw, fh)
             fps_prop = cap.get(cv2.CAP_PROP_FPS)
             if not fps_prop or fps_prop <= 1:
                 fps_prop = 30.0
-            self._target_fps = float(30 if fps_prop > 30 else int(fps_prop))
-            return True
-        return False
+            return (fw, fh), float(30 if fps_prop > 30 else int(fps_prop))
+        return None
 
 
     def _probe_viable(self, cap, max_frames=8):
@@ -133,6 +224,130 @@ class CameraWorker(QThread):
         return got >= 1 and nonblack >= 1
 
 
+    def _probe_attempt(self, codec, race):
+        # Worker Thread: Open + First Frame + Mode + Black-Frame Probe of one Backend (slow is fine, the race decides)
+        entry = {"backend": codec}
+        race.record(entry, result="running") # still blocked in OpenCV when reported (released on return)
+        t0 = time.perf_counter()
+        cap = None
+        result = "failed"
+        try:
+            cap = self._open_with_backend(codec)
+            race.record(entry, open_s=round(time.perf_counter() - t0, 3))
+            if cap is None:
+                result = "not opened"
+                return
+            if race.cancel.is_set():
+                result = "cancelled"
+                return
+
+            t = time.perf_counter()
+            ok, first = cap.read()
+            race.record(entry, first_frame_s=round(time.perf_counter() - t, 3))
+            if not ok or first is None:
+                result = "no frame"
+                return
+
+            config = None if race.cancel.is_set() else self._try_configure(cap)
+            if config is None or race.cancel.is_set() or not self._probe_viable(cap):
+                result = "cancelled" if race.cancel.is_set() else "not viable"
+                return
+            if not race.claim(codec, cap, config):
+                result = "cancelled" if race.winner is not None else "too late"
+                return
+            result = f"won {config[0][0]}x{config[0][1]} @ {config[1]:g}"
+            cap = None # owned by the CameraWorker now
+        finally:
+            race.record(entry, result=result, total_s=round(time.perf_counter() - t0, 3))
+            if cap is not None:
+                cap.release()
+            race.finished()
+
+
+    def _probe_backends(self, codecs, budget, grace=0.0):
+        # One Worker per Backend, First Viable Wins; Late or Losing Attempts Release their Capture
+        # budget: seconds to wait for a winner, grace: extra seconds for attempts still opening after it; stop() ends the wait early
+        race = _ProbeRace(len(codecs))
+        self._probe_race = race
+        if not self._active:
+            race.abort()
+        for codec in codecs:
+            threading.Thread(target=self._probe_attempt, args=(codec, race),
+                             name=f"probe-{codec}", daemon=True).start()
+        if not race.done.wait(budget) and grace > 0 and self._active:
+            slow = [c for c in codecs if race.running(c)]
+            if slow:
+                print(f"[INFO] Probe: waiting up to {grace:g}s more for {', '.join(c.upper() for c in slow)}")
+                race.done.wait(grace)
+        winner, report = race.close()
+
+        for entry in report:
+            times = ", ".join(f"{k[:-2]} {v:.2f}s" for k, v in entry.items() if k.endswith("_s"))
+            print(f"[INFO] Probe {entry['backend'].upper()}: {entry['result']}" + (f" ({times})" if times else ""))
+        if winner is None:
+            return None
+        codec, cap, (size, fps) = winner
+        self._size = size
+        self._target_fps = fps
+        self._backend_used = codec
+        return cap
+
+
+    def _open_cached(self):
+        # Last Working Config of this Camera Index (CAMERA_CACHE) --> one open, one mode, one probe
+        try:
+            cfg = json.loads(CAMERA_CACHE.read_text())[str(self._camera_index)]
+            backend = cfg["backend"]
+            w, h, fps = int(cfg["width"]), int(cfg["height"]), float(cfg["fps"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError): # Missing or Malformed --> full probe
+            return None
+        if not isinstance(backend, str) or backend not in BACKENDS:
+            return None
+
+        t = time.perf_counter()
+        cap = self._open_with_backend(backend)
+        if cap is None:
+            return None
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+        cap.set(cv2.CAP_PROP_FPS, fps)
+
+        # Same Mode as Last Time and not Black --> Accept (one read instead of the full probe)
+        ok, test = cap.read()
+        if (not ok or test is None or test.shape[1] != w or test.shape[0] != h
+                or cv2.countNonZero(cv2.cvtColor(test, cv2.COLOR_BGR2GRAY)) == 0):
+            cap.release()
+            print(f"[WARN] Cached Camera Config Failed: {cfg}")
+            return None
+
+        self._size = (w, h)
+        self._target_fps = fps
+        self._backend_used = backend
+        print(f"[INFO] Cached Camera Config: {backend.upper()} {w}x{h} @ {fps:g} in {time.perf_counter() - t:.2f}s")
+        return cap
+
+
+    def _save_config(self):
+        # Remember the Working Config for the next Launch (failure only costs a full probe)
+        try:
+            try:
+                cache = json.loads(CAMERA_CACHE.read_text())
+            except (OSError, ValueError):
+                cache = {}
+            if not isinstance(cache, dict): # Malformed --> rewritten
+                cache = {}
+            cache[str(self._camera_index)] = {
+                "backend": self._backend_used,
+                "width": int(self._size[0]),
+                "height": int(self._size[1]),
+                "fps": float(self._target_fps),
+            }
+            CAMERA_CACHE.parent.mkdir(parents=True, exist_ok=True)
+            CAMERA_CACHE.write_text(json.dumps(cache, indent=2))
+        except OSError as exc:
+            print(f"[WARN] Camera Config not Saved: {exc}")
+
+
     def _emit_config_once(self, cap):
         # Sends a Signal once if _size is Known
         if self._config_emitted or self._size is None:
@@ -149,24 +364,28 @@ class CameraWorker(QThread):
         # Main Thread Loop
         self._active = True
 
-        # Tries Different Frameworks (and respective codecs) in Order of Preference
-        order = ['msmf', 'dshow', 'any']
+        # Cached Config First, else Every Framework at once (first viable wins), else one by one (PROBE_FALLBACK_S each)
+        # (drivers that refuse a second open of the same device while another backend holds it, very slow opens)
         cap = None
+        preview = None
         try:
-            for codec in order:
-                possible_capture = self._open_with_backend(codec)
-                if possible_capture is None:
-                    continue
-                if not self._try_configure(possible_capture):
-                    possible_capture.release()
-                    continue
-                if not self._probe_viable(possible_capture):
-                    possible_capture.release()
-                    continue
-
-                cap = possible_capture
-                self._backend_used = codec
-                break
+            cap = self._open_cached()
+            if cap is None:
+                cap = self._probe_backends(BACKENDS, max(sum(PROBE_TIMEOUTS[c]) for c in BACKENDS) + PROBE_CONFIGURE_S,
+                                           grace=PROBE_FALLBACK_S) # a slow but working open is accepted
+                concurrent = self._probe_race
+                for codec in BACKENDS if cap is None else ():
+                    if not self._active:
+                        break
+                    if concurrent.running(codec): # never open a device twice while OpenCV still holds it
+                        print(f"[WARN] Probe {codec.upper()}: skipped, first open still blocked")
+                        continue
+                    cap = self._probe_backends((codec,), PROBE_FALLBACK_S)
+                    if cap is not None:
+                        break
+                self._probe_race = None
+                if cap is not None:
+                    self._save_config()
 
             # Abort if Camera not Avaiable
             if cap is None:
@@ -177,6 +396,8 @@ class CameraWorker(QThread):
             self._emit_config_once(cap)
             self._t0 = time.time()
             self._frame_count = 0
+            preview = threading.Thread(target=self._preview_loop, name="camera-preview", daemon=True)
+            preview.start()
 
             # Actual Main Loop
             while self._active:
@@ -189,16 +410,16 @@ class CameraWorker(QThread):
                     self._size = (w, h)
                     self._emit_config_once(cap) # Start Timer and Counter
 
-                # Preview (Live Stream) --> Inverted Horizontaly for user
-                rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-                rgb = cv2.flip(rgb, 1)
-                h, w, ch = rgb.shape
-                qimg = QImage(rgb.data, w, h, ch * w, QImage.Format.Format_RGB888).copy()
-                self.ImageUpdate.emit(qimg)
+                # Preview (Live Stream) --> Mailbox of the Preview Thread (replaces an unshown frame)
+                self._preview_box.put(frame_bgr)
 
-                # Write the Video if Set to Record and Writter is Active
-                if self._recording and self._writer is not None:
-                    self._writer.write(frame_bgr)
+                # Queue the Frame for the Encoder Thread if Set to Record (never blocks capture)
+                if self._trigger_state is not None:
+                    self._pre_trigger_frame(frame_bgr)
+                else:
+                    encoder = self._encoder
+                    if self._recording and encoder is not None:
+                        encoder.push(frame_bgr)
                 
                 # Efective Frame Rate --> Avoid Erroneous Info from Camera (Possibly Forced Before)    
                 self._frame_count += 1
@@ -211,30 +432,81 @@ class CameraWorker(QThread):
                     self._frame_count = 0
 
         finally:
-            # Releases Writter and VideoCapture
-            if self._writer is not None:
-                self._writer.release()
-                self._writer = None
+            # Stops the Preview, Releases Writter and VideoCapture
+            self._active = False
+            if preview is not None:
+                preview.join()
+            self._trigger_state = None
+            self._ring = None
+            self._close_encoder()
+            self._finish_online()
             if cap is not None:
                 cap.release()
 
 
-    def start_record(self, path, fps=None):
-        # Start Saving Raw Camera Frames
+    def _preview_loop(self):
+        # Preview Thread: at most preview_fps, always the newest frame (stale ones are never converted)
+        next_t = time.monotonic()
+        while self._active:
+            wait = next_t - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            frame_bgr = self._preview_box.take(timeout=0.2)
+            if frame_bgr is None:
+                continue
+            next_t = time.monotonic() + 1.0 / self.preview_fps
+            self.ImageUpdate.emit(self._preview_image(frame_bgr))
+
+
+    def _preview_image(self, frame_bgr):
+        # Downsize to the Label first (KeepAspectRatio), then RGB + Inverted Horizontaly for user
+        h, w = frame_bgr.shape[:2]
+        lw, lh = self._preview_size
+        scale = min(lw / w, lh / h, 1.0)
+        if scale < 1.0:
+            frame_bgr = cv2.resize(frame_bgr, (max(1, round(w * scale)), max(1, round(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+        rgb = cv2.flip(cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB), 1)
+        h, w, ch = rgb.shape
+        return QImage(rgb.data, w, h, ch * w, QImage.Format.Format_RGB888).copy()
+
+
+    def set_preview_size(self, width, height):
+        # GUI Thread: Label Size the Preview is Downsized to
+        self._preview_size = (max(1, int(width)), max(1, int(height)))
+
+
+    def start_record(self, path, fps=None, pre_trigger=None):
+        # Start Saving Raw Camera Frames (pre_trigger None --> PRE_TRIGGER)
         if self._size is None:
             self._size = (1920, 1080)
         if fps is None:
             fps = float(self._target_fps or 30)
+        if pre_trigger is None:
+            pre_trigger = PRE_TRIGGER
 
         # Close Previus Writter (Override)
-        if self._writer is not None:
-            self._writer.release()
-            self._writer = None
+        self._trigger_state = None
+        self._recording = False
+        self._close_encoder()
 
         # Creates New Directory 
         p = Path(path)
         p.parent.mkdir(parents=True, exist_ok=True)
+        self._path = p
+
+        if pre_trigger:
+            self._arm(fps)
+            return
 
+        writer = self._open_writer(p, fps)
+        if writer is None:
+            return
+        self._start_encoder(writer, fps)
+        self._recording = True
+
+
+    def _open_writer(self, p, fps):
         # Opens a Video Writter (MP4)
         w, h = int(self._size[0]), int(self._size[1])
         fourcc = cv2.VideoWriter_fourcc(*"mp4v")
@@ -250,32 +522,256 @@ class CameraWorker(QThread):
                 self._path = avi_path
             else:
                 print("[WARN] Failed to Write")
-                return
+                return None
         else:
             print("[DONE] MP4 Selected")
             self._path = p
+        return writer
+
+
+    def _start_encoder(self, writer, fps, preroll=None):
+        # Online detection of this recording (writes into the same folder as detector.main would)
+        self._finish_online()
+        self._wait_online(None) # the previous track files are closed before new ones open
+        self.online_summary = None
+        on_frame = None
+        if ONLINE_DETECTION:
+            online = onl.OnlineDetector(self._path.parent, fps)
+            online.start()
+            self._online = online
+            on_frame = online.push # fed by the encoder --> exactly the frames of the file
+
+        # Encoder Thread owns the Writter (room for the live frames queued while the pre-roll is written)
+        queue_size = max(rec.ENCODER_QUEUE, len(preroll)) if preroll is not None else rec.ENCODER_QUEUE
+        encoder = rec.FrameEncoder(writer, queue_size, preroll, on_frame)
+        encoder.start()
+        self._encoder = encoder
+
+
+    def _arm(self, fps):
+        # Pre-trigger capture: nothing on disk, the last PRE_TRIGGER_S kept in a preallocated ring
+        w, h = int(self._size[0]), int(self._size[1])
+        self._ring = rec.FrameRing(round(PRE_TRIGGER_S * fps), (h, w, 3))
+        if self._ring.capacity < dtc.CLEAN_SECONDS * fps:
+            print(f"[WARN] Pre-trigger ring holds {self._ring.capacity} frames, less than the clean interval")
+        self._record_fps = fps
+        self._trigger_request = False
+        self._motion_prev = None
+        self._still_frames = 0
+        self._trigger_state = "armed"
+        print(f"[INFO] Armed: {self._ring.capacity} frames pre-roll")
+
+
+    def _pre_trigger_frame(self, frame_bgr):
+        # Capture thread: ring until a trigger (motion or Stop), then write until the post-roll has passed
+        now = time.monotonic()
+        moving = False
+        if MOTION_TRIGGER:
+            thumb = prp.motion_thumbnail(frame_bgr)
+            if self._motion_prev is not None and thumb.shape == self._motion_prev.shape:
+                moving = prp.motion_energy(thumb, self._motion_prev) > MOTION_THRESHOLD
+            self._motion_prev = thumb
+
+        if self._trigger_state == "armed":
+            self._ring.push(frame_bgr)
+            # Motion only triggers after CLEAN_SECONDS of still table (the background interval of the file);
+            # earlier motion (the operator's hand leaving the table) restarts the wait
+            settled = self._still_frames >= min(self._ring.capacity, dtc.CLEAN_SECONDS * self._record_fps)
+            if moving and not settled:
+                self._still_frames = 0
+            elif not moving:
+                self._still_frames += 1
+            if not ((moving and settled) or self._trigger_request):
+                return
+
+            # Trigger: the encoder writes the ring (pre-roll) first, then the live frames
+            writer = self._open_writer(self._path, self._record_fps)
+            if writer is None:
+                self._trigger_state = None
+                return
+            print(f"[INFO] Triggered by {'Stop' if self._trigger_request else 'motion'}")
+            if not self._trigger_request:
+                # Pre-roll = the still run + this frame only (earlier motion in the ring would open the file
+                # and end up in the background median)
+                self._ring.keep_last(self._still_frames + 1)
+            self._start_encoder(writer, self._record_fps, preroll=self._ring)
+            self._trigger_state = "triggered"
+            self._post_until = now + POST_ROLL_S
+            return
+
+        encoder = self._encoder
+        if encoder is not None:
+            encoder.push(frame_bgr)
+        if moving and not self._trigger_request:
+            self._post_until = now + POST_ROLL_S # Stop fixes the end, motion no longer extends it
+        if now >= self._post_until:
+            self._trigger_state = None
+            self._close_encoder()
+            self._finish_online()
+            self._ring = None
+            self.RecordingSaved.emit(str(self._path))
 
-        # Add Writter as Object Attr and Updates Recording State
-        self._writer = writer
-        self._recording = True
+
+    def trigger_pending(self) -> bool:
+        # Pre-trigger recording armed or in its post-roll (closed by the capture thread)
+        return self._trigger_state is not None
 
 
     def stop_record(self):
         # Stops Recording and Releases Writter
-        if self._writer is not None:
-            self._writer.release()
-            self._writer = None
+        if self._trigger_state is not None:
+            # Pre-trigger: Stop is the manual trigger --> the capture thread saves pre-roll + POST_ROLL_S
+            if not self._trigger_request:
+                self._post_until = min(self._post_until, time.monotonic() + POST_ROLL_S)
+                self._trigger_request = True
+            return
         self._recording = False
+        self._close_encoder()
+        self._finish_online()
+
+
+    def _close_encoder(self):
+        # Writes the queued frames and releases the Writter on the encoder thread
+        encoder, self._encoder = self._encoder, None
+        if encoder is None:
+            return
+        self.encoder_stats = encoder.close()
+        print(f"[INFO] Encoder: {self.encoder_stats}")
+
+
+    def _finish_online(self):
+        # Analyse the queued frames and close the online track files on their own thread (never blocks the caller)
+        online, self._online = self._online, None
+        if online is None:
+            return
+        finisher = threading.Thread(target=self._online_done, args=(online, str(self._path)),
+                                    name="online-finish", daemon=True)
+        self._online_finisher = finisher
+        finisher.start()
+
+
+    def _online_done(self, online, video):
+        # Finisher Thread: drains the backlog (at most ONLINE_QUEUE frames), then reports
+        summary = online.finish()
+        summary["video"] = video
+        self.online_summary = summary
+        print(f"[INFO] Online detection: {summary}")
+        self.OnlineFinished.emit(summary)
+
+
+    def _wait_online(self, timeout) -> bool:
+        # False while the last online detection is still draining after `timeout` seconds
+        finisher = self._online_finisher
+        if finisher is not None:
+            finisher.join(timeout)
+            return not finisher.is_alive()
+        return True
+
+
+    def online_pending(self) -> bool:
+        return not self._wait_online(0)
+
+
+    def online_tracks_ready(self, video_path, timeout=0.0) -> bool:
+        # True when the online tracks of `video_path` equal an offline analysis (waits up to `timeout` for the drain)
+        if not self._wait_online(timeout):
+            return False
+        s = self.online_summary
+        return s is not None and s["complete"] and Path(s["video"]) == Path(video_path)
 
 
     def stop(self):
         # Stop Thread
         print("[EXIT] Camera Thread")
         self._active = False
+        race = self._probe_race
+        if race is not None:
+            race.abort()
         self.wait(500)
 
 
 
+class AnalysisWorker(QThread):
+    # frames done, total frames (0 = unknown), ETA in seconds (-1 = unknown)
+    Progress = pyqtSignal(int, int, float)
+    Finished = pyqtSignal(int) # collision frame
+    Failed = pyqtSignal(str)
+    Cancelled = pyqtSignal()
+
+    def __init__(self, video_path, parent_path, fps_eff, masses, radius, tracks_ready=None, parent=None):
+        # Everything the job needs is copied here --> the thread never touches widgets
+        super().__init__(parent)
+        self._tracks_ready = tracks_ready # callable: disk_tracks.npz written by online detection (may wait for it)
+        self._video_path = Path(video_path)
+        self._parent_path = Path(parent_path)
+        self._fps_eff = float(fps_eff)
+        self._masses = masses
+        self._radius = radius
+        self._cancel = threading.Event()
+        self._t0 = None
+        self._last_emit = 0.0
+        self.profile_summary = None # status bar line when detector.PROFILE is on
+
+
+    def cancel(self):
+        # Stops at the next frame (detector.main checks the event once per frame)
+        self._cancel.set()
+
+
+    def _on_progress(self, done, total):
+        # Called from detector.main for every frame --> rate limited signal with ETA
+        now = time.monotonic()
+        if self._t0 is None:
+            self._t0 = now
+        if now - self._last_emit < PROGRESS_INTERVAL and done != total:
+            return
+        self._last_emit = now
+
+        elapsed = now - self._t0
+        eta = elapsed / done * (total - done) if total and done else -1.0
+        self.Progress.emit(done, total, eta)
+
+
+    def run(self):
+        # Path Logic
+        parent = self._parent_path
+        bg_path = parent / "table_background.png"
+        csv_path = parent / "disk_tracks.csv"
+        npz_path = parent / "disk_tracks.npz" # typed copy read back by post-processing
+        png_path = parent / "trajectories.png"
+        xlsx_path = parent / "data.xlsx"
+
+        # Inputs of this trial, so batch.py can re-analyse it headless later
+        trial = {"masses": list(self._masses), "radius": list(self._radius), "fps": self._fps_eff}
+        try:
+            (parent / "trial.json").write_text(json.dumps(trial, indent=2))
+        except OSError as exc: # Only metadata for batch.py --> the analysis itself still runs
+            print(f"[WARN] Could not save trial.json: {exc}")
+
+        try:
+            # Detection (no overlay video during analysis --> render.py draws detection.mp4 on demand)
+            if self._tracks_ready is None or not self._tracks_ready():
+                report = dtc.main(self._video_path, bg_path, None, csv_path, self._fps_eff,
+                                  npz_path=npz_path, progress=self._on_progress, cancel=self._cancel)
+                if report is not None:
+                    self.profile_summary = prf.StageProfiler.summary(report)
+            if self._cancel.is_set():
+                raise dtc.AnalysisCancelled("Analysis cancelled")
+
+            # Post-processing: trajectory image + student Excel
+            cf = ptp.visualize_trajectories(npz_path, png_path, self._fps_eff, show_equal_aspect=True)
+            ptp.build_student_excel(npz_path, xlsx_path, self._masses, self._radius, self._fps_eff, include_metrics=True)
+        except dtc.AnalysisCancelled:
+            self.Cancelled.emit()
+            return
+        except Exception as exc:
+            print(f"[WARN] Analysis failed: {exc}")
+            self.Failed.emit(str(exc))
+            return
+        self.Finished.emit(int(cf))
+
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         # Initialize and Load the GUI
@@ -358,7 +854,7 @@ class MainWindow(QMainWindow):
             self.btnNext4.setEnabled(False)
         
         if self.btnGen and self.stack:
-            self.btnGen.clicked.connect(lambda: (self.btnGen.setEnabled(False), hp.generate(self)))
+            self.btnGen.clicked.connect(lambda: hp.generate(self))
         if self.btnPreview and self.stack:
             self.btnPreview.clicked.connect(lambda: (hp.preview(self), hp.genData(self)))
         if self.btnRedo and self.stack:
@@ -386,14 +882,27 @@ class MainWindow(QMainWindow):
         self.preview_ready = False
         self.worker = CameraWorker()
         self.worker.ImageUpdate.connect(self.on_image_update)
+        if PREVIEW_FPS is None:
+            screen = QApplication.primaryScreen()
+            if screen is not None and screen.refreshRate() > 1:
+                self.worker.preview_fps = screen.refreshRate() # no point drawing faster than the display
         self.worker.ConfigReady.connect(self.on_cam_config)
         
         # Create and Update a StatusBar
         self._sb = self.statusBar()
         self.worker.ConfigReady.connect(self.on_cam_config)
         self.worker.StatsUpdate.connect(self.on_cam_stats)
+        self.worker.RecordingSaved.connect(lambda path: hp.recording_saved(self, path))
+        self.worker.OnlineFinished.connect(self.on_online_finished)
         self._last_cfg_msg = ""
 
+        # Analysis job (created per run by hp.generate) + its progress bar
+        self.analysis = None
+        self._progress = QProgressBar()
+        self._progress.setMaximumWidth(200)
+        self._progress.setVisible(False)
+        self._sb.addPermanentWidget(self._progress)
+
     
     def on_cam_config(self, w, h, fps, backend):
         # Update StatusBar Message
@@ -410,16 +919,25 @@ class MainWindow(QMainWindow):
             self.showUpdate = True
     
     
+    def on_online_finished(self, summary: dict):
+        # Online Detection Drained after Stop (the analysis thread may be waiting for it)
+        if self.analysis_running():
+            return
+        if summary["complete"]:
+            self._sb.showMessage(f"Online tracks ready: {summary['rows']} detections", 5000)
+        else:
+            self._sb.showMessage(f"Online detection incomplete ({summary['dropped']} frames dropped): full analysis needed", 5000)
+
+
     def on_image_update(self, qimage: QImage):
         # Safeguard Against Bugs (bad connection on __init__)
         if not self.videoLabel:
             return
         
-        # Convert to a Qt Readable Format
-        pix = QPixmap.fromImage(qimage).scaled(self.videoLabel.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation)
-        self.videoLabel.setPixmap(pix)
+        # Already Downsized by the Preview Thread --> only Convert to a Qt Readable Format
+        self.videoLabel.setPixmap(QPixmap.fromImage(qimage))
+        size = self.videoLabel.size()
+        self.worker.set_preview_size(size.width(), size.height()) # follows window resizes
 
         # Enable Record once Camera is UP
         if not self.preview_ready:
@@ -429,6 +947,46 @@ class MainWindow(QMainWindow):
                 self.btnRecord.setEnabled(True)
 
 
+    def start_analysis(self, video_path, parent_path, fps_eff, masses, radius):
+        # Runs detection (skipped when the online tracks are complete) + post-processing on an AnalysisWorker thread
+        # Online tracks still draining --> the analysis thread waits for them (never the GUI)
+        worker = self.worker
+        self.analysis = AnalysisWorker(video_path, parent_path, fps_eff, masses, radius,
+                                       lambda: worker.online_tracks_ready(video_path, timeout=None), self)
+        self.analysis.Progress.connect(self.on_analysis_progress)
+        self.analysis.Finished.connect(lambda cf: hp.analysis_done(self, cf))
+        self.analysis.Failed.connect(lambda msg: hp.analysis_stopped(self, f"Analysis failed: {msg}"))
+        self.analysis.Cancelled.connect(lambda: hp.analysis_stopped(self, "Analysis cancelled"))
+
+        self._progress.setRange(0, 0) # busy until the first frame (background estimation)
+        self._progress.setVisible(True)
+        if worker.online_pending():
+            self._sb.showMessage("Analysing: finishing online detection...")
+        elif worker.online_tracks_ready(video_path):
+            self._sb.showMessage("Analysing: tracks from recording...")
+        else:
+            self._sb.showMessage("Analysing: estimating background...")
+        self.analysis.start()
+
+
+    def analysis_running(self) -> bool:
+        return self.analysis is not None and self.analysis.isRunning()
+
+
+    def on_analysis_progress(self, done: int, total: int, eta: float):
+        # Progress bar + ETA on the StatusBar
+        if total > 0:
+            self._progress.setRange(0, total)
+            self._progress.setValue(min(done, total))
+            msg = f"Analysing: frame {done}/{total} ({100 * done / total:.0f}%)"
+        else:
+            msg = f"Analysing: frame {done}"
+        if eta >= 0:
+            m, sec = divmod(int(round(eta)), 60)
+            msg += f" | ETA {m}:{sec:02d}"
+        self._sb.showMessage(msg)
+
+
     def stop_camera(self):
         # Closes the CameraWorker Thread
         if hasattr(self, "worker") and self.worker.isRunning():
@@ -436,8 +994,11 @@ class MainWindow(QMainWindow):
 
 
     def closeEvent(self, event):
-        # Closes Camera Related Events
+        # Closes Camera Related Events and a running analysis
         self.stop_camera()
+        if self.analysis_running():
+            self.analysis.cancel()
+            self.analysis.wait()
         super().closeEvent(event)
 
 
@@ -0,0 +1,149 @@
+'''
+Background model cache
+Keeps the median background in memory and next to the recording on disk,
+keyed by a hash of the video content and the estimation parameters
+
+'''
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+import Pre_process as prp
+
+
+CACHE_VERSION = 1 # bump when the background algorithm changes its output
+MEMORY_SLOTS = 4 # backgrounds kept in memory (least recently used is dropped)
+
+_memory: "OrderedDict[str, np.ndarray]" = OrderedDict() # key -> background image
+_fingerprints = {} # (path, size, mtime_ns) -> content hash
+
+
+def video_fingerprint(video_path, chunk_size: int = 1 << 20) -> str:
+    """
+    Content hash (BLAKE2b) of the video file. Memoized on (path, size, mtime) so
+    an unchanged recording is only read once per session.
+    """
+    p = Path(video_path).resolve()
+    st = p.stat()
+    stamp = (str(p), st.st_size, st.st_mtime_ns)
+    if stamp in _fingerprints:
+        return _fingerprints[stamp]
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _fingerprints[stamp] = digest
+    return digest
+
+
+def cache_key(
+    video_path,
+    clean_seconds: float,
+    frame_sample_limit: int,
+    blur_kernel: Optional[Tuple[int, int]],
+) -> str:
+    # Video content + every parameter that changes the background image
+    params = {
+        "version": CACHE_VERSION,
+        "video": video_fingerprint(video_path),
+        "clean_seconds": float(clean_seconds),
+        "frame_sample_limit": int(frame_sample_limit),
+        "blur_kernel": None if blur_kernel is None else [int(k) for k in blur_kernel],
+    }
+    blob = json.dumps(params, sort_keys=True).encode()
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+def _key_path(bg_path: Path) -> Path:
+    # Sidecar holding the key of the background image saved at bg_path
+    return bg_path.with_name(bg_path.name + ".key")
+
+
+def _remember(key: str, background: np.ndarray) -> None:
+    # Private copy: the caller may modify the image it was given
+    _memory[key] = background.copy()
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_SLOTS:
+        _memory.popitem(last=False)
+
+
+def load_background(
+    video_path,
+    bg_path,
+    clean_seconds: float,
+    frame_sample_limit: int,
+    blur_kernel: Optional[Tuple[int, int]],
+    **estimate_kwargs,
+) -> np.ndarray:
+    """
+    Return the median background for `video_path`, computing it only on a miss.
+
+    Lookup order:
+      1) in-memory cache (same key this session)
+      2) `bg_path` on disk, if its sidecar key matches
+      3) prp.estimate_background_median (saved to `bg_path` + sidecar)
+
+    Extra keyword arguments (sampling, estimator, workers, ...) are passed to
+    estimate_background_median; they do not change the image so they are not
+    part of the key. The returned image is the caller's own copy.
+    """
+    bg_path = Path(bg_path)
+    key = cache_key(video_path, clean_seconds, frame_sample_limit, blur_kernel)
+    key_file = _key_path(bg_path)
+
+    # 1) Memory
+    if key in _memory:
+        _memory.move_to_end(key)
+        if not bg_path.exists():
+            cv2.imwrite(str(bg_path), _memory[key])
+            key_file.write_text(key)
+        return _memory[key].copy()
+
+    # 2) Disk
+    try:
+        stored = key_file.read_text().strip()
+    except OSError:
+        stored = None
+    if stored == key and bg_path.exists():
+        background = cv2.imread(str(bg_path))
+        if background is not None:
+            _remember(key, background)
+            return background
+
+    # 3) Compute (drop the stale sidecar first so a failed run never looks valid)
+    if key_file.exists():
+        key_file.unlink()
+    _, background = prp.estimate_background_median(
+        video_path         = str(video_path),
+        clean_seconds      = clean_seconds,
+        frame_sample_limit = frame_sample_limit,
+        blur_kernel        = blur_kernel,
+        output_path        = str(bg_path),
+        return_image       = True,
+        **estimate_kwargs
+    )
+    key_file.write_text(key)
+    _remember(key, background)
+    return background
+
+
+def invalidate(bg_path=None) -> None:
+    """
+    Forget cached backgrounds: all of them in memory, plus the disk entry at
+    `bg_path` when given.
+    """
+    _memory.clear()
+    _fingerprints.clear()
+    if bg_path is not None:
+        key_file = _key_path(Path(bg_path))
+        if key_file.exists():
+            os.remove(key_file)
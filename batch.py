@@ -0,0 +1,181 @@
+'''
+Headless batch analysis
+Finds every trial (<root>/<group>/Recording.mp4) under the Collision_Study
+folder, runs background estimation, detection and the student Excel on
+worker processes, skips trials whose outputs are up to date and writes a
+summary table
+
+    python batch.py                                  # ~/Desktop/Collision_Study
+    python batch.py D:/Collision_Study --workers 4 --force
+
+'''
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+import pandas as pd
+
+import Post_process as ptp
+import detector as dtc
+import tracks as trk
+
+
+DEFAULT_ROOT = Path(os.path.expanduser("~")) / "Desktop" / "Collision_Study" # same tree as helper.file_manager
+RECORDING_NAMES = ("Recording.mp4", "Recording.avi") # app.CameraWorker falls back to AVI
+TRIAL_INFO = "trial.json" # masses/radius/fps written by the GUI analysis job
+STAMP_NAME = "batch_stamp.json" # inputs + settings of the last batch run of a trial
+SUMMARY_NAME = "batch_summary.csv"
+OUTPUTS = ("disk_tracks.csv", "disk_tracks.npz", "data.xlsx")
+BATCH_VERSION = 1 # bump when the analysis changes its output
+
+DEFAULT_MASSES = (dtc.DEFAULT_MASS, dtc.DEFAULT_MASS) # kg (green, blue)
+DEFAULT_RADIUS = (dtc.DISK_DIAMETER_MM / 2000.0,) * 2 # m (green, blue)
+
+SUMMARY_COLUMNS = [
+    "group", "status", "seconds", "rows",
+    "collision_frame", "restitution_e", "momentum_error_rel", "energy_drop_rel_COM",
+    "error",
+]
+
+
+def discover_trials(root) -> list:
+    # Every <root>/<group> folder holding a recording, sorted by group
+    trials = []
+    for sub in sorted(Path(root).iterdir()):
+        if not sub.is_dir():
+            continue
+        video = next((sub / n for n in RECORDING_NAMES if (sub / n).exists()), None)
+        if video is not None:
+            trials.append(video)
+    return trials
+
+
+def trial_settings(video: Path, masses, radius) -> dict:
+    """
+    Analysis inputs of one trial: trial.json (saved by the GUI) wins over the
+    command-line defaults; fps falls back to the container's frame rate.
+    """
+    settings = {"masses": list(masses), "radius": list(radius), "fps": None}
+    info = video.parent / TRIAL_INFO
+    if info.exists():
+        settings.update({k: v for k, v in json.loads(info.read_text()).items() if k in settings})
+    if not settings["fps"]:
+        cap = cv2.VideoCapture(str(video))
+        settings["fps"] = float(cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        cap.release()
+    return settings
+
+
+def _stamp(video: Path, settings: dict) -> str:
+    # Recording (size + mtime) + analysis settings + detector switches that change the tracks
+    st = video.stat()
+    params = {
+        "version": BATCH_VERSION,
+        "video": [video.name, st.st_size, st.st_mtime_ns],
+        "settings": settings,
+        "adaptive": dtc.ADAPTIVE,
+        "trim_idle": dtc.TRIM_IDLE,
+    }
+    return hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def _up_to_date(video: Path, stamp: str):
+    # Stored summary row when every output exists and the stamp matches, else None
+    folder = video.parent
+    try:
+        stored = json.loads((folder / STAMP_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+    if stored.get("stamp") != stamp or not all((folder / n).exists() for n in OUTPUTS):
+        return None
+    return stored.get("row")
+
+
+def _init_worker():
+    # One process per trial --> no detector threads on top (avoids oversubscription)
+    dtc.PIPELINE_WORKERS = 0
+    dtc.BG_WORKERS = 1
+    cv2.setNumThreads(1)
+
+
+def analyse_trial(video, masses=DEFAULT_MASSES, radius=DEFAULT_RADIUS, force=False) -> dict:
+    """
+    Worker process: background + detection + data.xlsx for one trial.
+    returns: summary row (SUMMARY_COLUMNS)
+    """
+    video = Path(video)
+    folder = video.parent
+    row = dict.fromkeys(SUMMARY_COLUMNS)
+    row["group"] = folder.name
+    t0 = time.perf_counter()
+    try:
+        settings = trial_settings(video, masses, radius)
+        stamp = _stamp(video, settings)
+        stored = None if force else _up_to_date(video, stamp)
+        if stored is not None:
+            return dict(stored, status="up to date", seconds=0.0)
+
+        (folder / STAMP_NAME).unlink(missing_ok=True) # a failed run never looks up to date
+        csv_path, npz_path = folder / "disk_tracks.csv", folder / "disk_tracks.npz"
+        dtc.main(str(video), folder / "table_background.png", None, csv_path, settings["fps"], npz_path=npz_path)
+        ptp.build_student_excel(npz_path, folder / "data.xlsx", tuple(settings["masses"]), tuple(settings["radius"]),
+                                settings["fps"], include_metrics=True)
+        metrics = ptp.collision_metrics(npz_path, tuple(settings["masses"]), tuple(settings["radius"]), settings["fps"])
+
+        row.update({k: metrics[k] for k in ("collision_frame", "restitution_e", "momentum_error_rel", "energy_drop_rel_COM")})
+        row["rows"] = len(trk.read_tracks(npz_path))
+        row["status"] = "analysed"
+        row["seconds"] = round(time.perf_counter() - t0, 2)
+        (folder / STAMP_NAME).write_text(json.dumps({"stamp": stamp, "row": row}, indent=2, default=float))
+    except Exception as exc:
+        row.update(status="failed", error=f"{type(exc).__name__}: {exc}", seconds=round(time.perf_counter() - t0, 2))
+    return row
+
+
+def run_batch(root, workers=None, masses=DEFAULT_MASSES, radius=DEFAULT_RADIUS, force=False, summary_path=None) -> pd.DataFrame:
+    """
+    Analyse every trial under `root` on `workers` processes (None -> CPU count)
+    and save the summary table (root/batch_summary.csv by default).
+    """
+    root = Path(root)
+    trials = discover_trials(root)
+    print(f"[Info] {len(trials)} trials under {root}")
+
+    rows = []
+    if trials:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(trials)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(analyse_trial, str(v), masses, radius, force): v for v in trials}
+            for fut in as_completed(futures):
+                row = fut.result()
+                rows.append(row)
+                print(f"[{row['status']}] {row['group']}" + (f" ({row['error']})" if row["error"] else ""))
+
+    summary = pd.DataFrame(rows, columns=SUMMARY_COLUMNS).sort_values("group").reset_index(drop=True)
+    summary_path = Path(summary_path) if summary_path is not None else root / SUMMARY_NAME
+    summary.to_csv(summary_path, index=False)
+    print(f"[Done] Summary saved to {summary_path}")
+    return summary
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Analyse every trial under the Collision_Study folder")
+    parser.add_argument("root", nargs="?", default=str(DEFAULT_ROOT), help="folder with one sub-folder per group")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--masses", type=float, nargs=2, default=DEFAULT_MASSES, metavar=("GREEN", "BLUE"),
+                        help="kg, used when a trial has no trial.json")
+    parser.add_argument("--radius", type=float, nargs=2, default=DEFAULT_RADIUS, metavar=("GREEN", "BLUE"),
+                        help="m, used when a trial has no trial.json")
+    parser.add_argument("--force", action="store_true", help="re-analyse up-to-date trials too")
+    parser.add_argument("--summary", default=None, help=f"summary CSV (default: <root>/{SUMMARY_NAME})")
+    args = parser.parse_args()
+    summary = run_batch(args.root, args.workers, tuple(args.masses), tuple(args.radius), args.force, args.summary)
+    print(summary.to_string(index=False))
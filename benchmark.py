@@ -0,0 +1,245 @@
+'''
+Throughput benchmarks
+Times the background estimation, disk segmentation, marker detection and the
+full detector.main on synthetic collision videos (synthetic.py) in frames per
+second, checks detection accuracy against the ground truth and compares the
+results with the stored baselines. The tracker ID checks run first (no video)
+
+    python benchmark.py                      # run + compare with benchmark_baseline.json
+    python benchmark.py --update-baseline    # run + store as the new baseline
+
+'''
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pandas as pd
+
+import Pre_process as prp
+import background_cache as bgc
+import detector as dtc
+import synthetic as syn
+import tracker as tkr
+
+
+BASELINE_PATH = Path(__file__).with_name("benchmark_baseline.json")
+TOLERANCE = 0.2 # fps below baseline * (1 - TOLERANCE) is a regression
+MAX_CENTER_ERR_PX = 2.0 # mean centre error above this fails the accuracy check
+
+# Synthetic videos (render_collision_video arguments), rendered once per work dir
+CASES = {
+    "720p30": dict(width=1280, height=720, fps=30.0, seconds=6.0, blur_samples=3, noise_sigma=2.0, seed=1),
+    "1080p60": dict(width=1920, height=1080, fps=60.0, seconds=5.0, blur_samples=2, noise_sigma=2.0, seed=2),
+}
+
+
+def _video(case: str, workdir: Path) -> Path:
+    # Render the case video (and its truth CSV) unless it is already there
+    video = workdir / f"{case}.mp4"
+    truth = workdir / f"{case}_truth.csv"
+    if not (video.exists() and truth.exists()):
+        print(f"[Info] Rendering {case} ...")
+        syn.render_collision_video(video, **CASES[case])
+    return video
+
+
+def _best_of(fn, repeats: int) -> float:
+    # Fastest wall time of `repeats` calls (least disturbed by the machine)
+    best = float("inf")
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def bench_background(video: Path, workdir: Path, repeats: int) -> dict:
+    # estimate_background_median with the detector's settings; fps = clean-interval frames / s
+    cap = cv2.VideoCapture(str(video))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    frames = int(dtc.CLEAN_SECONDS * fps)
+    out = workdir / "bench_background.png"
+
+    def run():
+        prp.estimate_background_median(
+            str(video), dtc.CLEAN_SECONDS, dtc.FRAME_LIMIT_AVG, dtc.BLUR_KERNEL,
+            output_path=str(out), sampling=dtc.BG_SAMPLING, estimator=dtc.BG_ESTIMATOR, workers=dtc.BG_WORKERS,
+        )
+    return {"fps": round(frames / _best_of(run, repeats), 2)}
+
+
+def _load_frames(video: Path, truth: pd.DataFrame):
+    # Frames where both disks are fully visible (decoded once, outside the timings)
+    frames = {}
+    visible = truth[truth["visible"]].groupby("frame").filter(lambda g: len(g) == 2)
+    wanted = set(visible["frame"].unique())
+    cap = cv2.VideoCapture(str(video))
+    idx = 0
+    while wanted:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if idx in wanted:
+            frames[idx] = frame
+            wanted.discard(idx)
+        idx += 1
+    cap.release()
+    return frames, visible
+
+
+def bench_segment(frames: dict, background: np.ndarray, repeats: int) -> dict:
+    # Full-frame segment_disks on every frame with both disks in view
+    ctx = prp.ProcessingContext(background.shape)
+    images = list(frames.values())
+
+    def run():
+        for f in images:
+            prp.segment_disks(f, background, thresh_val=50, morph_kernel=(5, 5), min_radius=10, max_radius=200, ctx=ctx)
+    return {"fps": round(len(images) / _best_of(run, repeats), 2)}
+
+
+def bench_marker(frames: dict, truth: pd.DataFrame, repeats: int) -> dict:
+    # detect_marker_center for both disks (true centre/radius, own colour) per frame
+    ctx = prp.ProcessingContext(next(iter(frames.values())).shape)
+    ranges = list(dtc.MARKER_COLORS.values())
+    jobs = [
+        (frames[int(r.frame)], (r.cx_px, r.cy_px), r.r_px, ranges[int(r.disk_id)])
+        for r in truth.itertuples() if int(r.frame) in frames
+    ]
+
+    def run():
+        for frame, center, radius, (lo, hi) in jobs:
+            prp.detect_marker_center(frame, center, radius, lo, hi, ctx=ctx)
+    return {"fps": round(len(frames) / _best_of(run, repeats), 2)}
+
+
+def bench_main(video: Path, truth: pd.DataFrame, workdir: Path, repeats: int) -> dict:
+    # Whole analysis (background included, cache dropped every run) + accuracy vs ground truth
+    bg_path = workdir / "bench_main_background.png"
+    csv_path = workdir / "bench_main_tracks.csv"
+    cap = cv2.VideoCapture(str(video))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    def run():
+        bgc.invalidate(bg_path)
+        dtc.main(str(video), bg_path, None, csv_path, fps)
+    wall = _best_of(run, repeats)
+
+    det = pd.read_csv(csv_path)
+    merged = truth[truth["visible"]].merge(det, on=["frame", "disk_id"], how="left", suffixes=("", "_det"))
+    found = merged["cx_px_det"].notna()
+    err = np.hypot(merged["cx_px"] - merged["cx_px_det"], merged["cy_px"] - merged["cy_px_det"])[found]
+    return {
+        "fps": round(n_frames / wall, 2),
+        "detected": round(float(found.mean()), 4),
+        "center_err_px": round(float(err.mean()), 3) if len(err) else None,
+    }
+
+
+def run_suite(workdir: Path, repeats: int, cases=None) -> dict:
+    # {case: {benchmark: {"fps": ..., ...}}}
+    results = {}
+    for case in cases or CASES:
+        video = _video(case, workdir)
+        truth = pd.read_csv(workdir / f"{case}_truth.csv")
+        bench_background(video, workdir, 1) # warm-up (decoder, page cache)
+        background = cv2.imread(str(workdir / "bench_background.png"))
+        frames, visible = _load_frames(video, truth)
+
+        results[case] = {
+            "estimate_background_median": bench_background(video, workdir, repeats),
+            "segment_disks": bench_segment(frames, background, repeats),
+            "detect_marker_center": bench_marker(frames, visible, repeats),
+            "detector.main": bench_main(video, truth, workdir, repeats),
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    # Print a table against the baseline; False on any fps regression or accuracy failure
+    ok = True
+    print(f"{'case':<9} {'benchmark':<28} {'fps':>9} {'baseline':>9} {'ratio':>7}")
+    for case, benches in results.items():
+        for name, res in benches.items():
+            base = baseline.get("results", {}).get(case, {}).get(name, {}).get("fps")
+            ratio = res["fps"] / base if base else None
+            flag = ""
+            if ratio is not None and ratio < 1 - tolerance:
+                flag, ok = "  REGRESSION", False
+            err = res.get("center_err_px")
+            if err is not None and err > MAX_CENTER_ERR_PX:
+                flag, ok = f"  ACCURACY ({err} px)", False
+            base_s = f"{base:9.1f}" if base else f"{'-':>9}"
+            ratio_s = f"{ratio:7.2f}" if ratio else f"{'-':>7}"
+            acc = f"  detected {res['detected']:.1%}, err {err} px" if "detected" in res else ""
+            print(f"{case:<9} {name:<28} {res['fps']:9.1f} {base_s} {ratio_s}{acc}{flag}")
+    return ok
+
+
+def _disk(x, color=None):
+    return {"center": (float(x), 50.0), "radius": 20.0, "marker_center": None, "marker_color": color}
+
+
+# Detections per frame -> ids the tracker must give (IDAssigner's answer)
+TRACKER_CASES = {
+    # Green tracked, then its marker is missed right on the prediction: still id 0, never the unseen blue id
+    "missed marker, other id unseen": (
+        [[_disk(100, "green")], [_disk(110, "green")], [_disk(120)], [_disk(130)], [_disk(140, "green")]],
+        [[0], [0], [0], [0], [0]],
+    ),
+}
+
+
+def check_tracker() -> bool:
+    # MultiDiskTracker vs the expected ids (same as detector.IDAssigner) on the hand-made sequences
+    ok = True
+    for name, (frames, expected) in TRACKER_CASES.items():
+        for label, assigner in (("IDAssigner", dtc.IDAssigner(dtc.COLOR_ID_MAP)), ("kalman", tkr.MultiDiskTracker(dtc.COLOR_ID_MAP))):
+            got = [[pid for pid, _ in assigner.assign(dets)] for dets in frames]
+            if got != expected:
+                print(f"[Warn] Tracker check '{name}' ({label}): ids {got}, expected {expected}")
+                ok = False
+    print(f"[{'Done' if ok else 'Warn'}] Tracker checks: {len(TRACKER_CASES)} {'passed' if ok else 'FAILED'}")
+    return ok
+
+
+def _machine() -> dict:
+    return {"python": sys.version.split()[0], "opencv": cv2.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput benchmarks on synthetic collision videos")
+    parser.add_argument("--workdir", default=str(Path(tempfile.gettempdir()) / "collision_bench"),
+                        help="where the synthetic videos are rendered (kept between runs)")
+    parser.add_argument("--repeats", type=int, default=3, help="best-of repeats per benchmark")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="only this case (repeatable)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed fps drop vs baseline")
+    parser.add_argument("--update-baseline", action="store_true", help=f"store the results in {BASELINE_PATH.name}")
+    args = parser.parse_args()
+
+    tracker_ok = check_tracker()
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    results = run_suite(workdir, args.repeats, args.case)
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if baseline and baseline.get("machine", {}).get("cpus") != os.cpu_count():
+        print(f"[Warn] Baseline recorded on {baseline['machine'].get('cpus')} CPUs, this machine has {os.cpu_count()}")
+    ok = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        merged = dict(baseline.get("results", {}), **results)
+        BASELINE_PATH.write_text(json.dumps({"machine": _machine(), "results": merged}, indent=2))
+        print(f"[Done] Baseline saved to {BASELINE_PATH.name}")
+    sys.exit(0 if (ok or args.update_baseline) and tracker_ok else 1)
@@ -5,19 +5,45 @@ import cv2
 import numpy as np
 
 # Built-in modules
-import csv
 import math
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 # Personal Modules
 import Pre_process as prp 
+import activity as act
+import background_cache as bgc
+import profiler as prf
+import render
+import tracker as tkr
+import tracks as trk
 
 # 1) Core global constants
 FRAME_LIMIT_AVG  = 60 # maximum amount of frames needed to average the background 
 CLEAN_SECONDS = 2.0 # first part of the video where script averages the background
 BLUR_KERNEL  = (5, 5) # diemnsion of the kernel used in the Gaussian Blur  
+BG_SAMPLING = "sequential" # single forward pass over the clean interval (no seeks)
+BG_ESTIMATOR = "histogram" # exact median with bounded memory (tiles of per-pixel counts)
+BG_WORKERS = min(4, os.cpu_count() or 1) # threads sharing the background tiles
 DEFAULT_MASS = 0.0118 # default mass  
+ROI_TRACKING = True # segment only around the tracker predictions when every disk is tracked
+ROI_PAD_FACTOR = 2.0 # ROI half-size in disk radii
+FULL_SCAN_INTERVAL = 30 # frames between forced full-frame scans (catches new disks)
+PYRAMID_SCALE = 0.5 # coarse-to-fine full scans on a frame downscaled by this factor (None = full resolution)
+PIPELINE_WORKERS = max(0, min(4, (os.cpu_count() or 1) - 2)) # detection threads (0 = serial loop with ROI tracking)
+PIPELINE_QUEUE = 16 # frames in flight between the decoder and the annotator/encoder
+CHUNK_PROCESSES = 0 # >0: split the video into frame ranges analysed by this many processes
+CHUNKS_PER_PROCESS = 2 # more chunks than processes to balance uneven chunks
+ADAPTIVE = False # locate the collision with a cheap pass, then analyse only a window around it
+ADAPTIVE_STRIDE = 4 # cheap pass: segment one frame out of every ADAPTIVE_STRIDE (centres only, no markers)
+ADAPTIVE_MARGIN_S = 1.0 # seconds of free flight kept at full fidelity before and after the collision
+TRIM_IDLE = False # analyse only where something moves (activity.py index next to the video); background still from the clean interval
+TRIM_MARGIN_S = 0.5 # seconds kept before the first and after the last motion
+PROFILE = False # per-stage timings (calls, totals, per-frame percentiles) saved to <csv>_profile.json
 
 # HSV ranges for the offset mark
 GREEN_LOWER = np.array([40, 80, 80])
@@ -25,12 +51,35 @@ GREEN_UPPER = np.array([90, 255, 255])
 BLUE_LOWER  = np.array([100, 100, 100])
 BLUE_UPPER  = np.array([130, 255, 255])
 
+# Marker colour -> HSV range, in priority order (classified in a single pass)
+MARKER_COLORS = {
+    "green": (GREEN_LOWER, GREEN_UPPER),
+    "blue":  (BLUE_LOWER, BLUE_UPPER),
+}
+MARKER_LUT_BITS = None # opt-in BGR -> colour lookup table (bits per channel); skips CLAHE, so labels can differ on dim footage
+_marker_lut = None # built on first use, once per process
+
 # Real disk diameter in mm 
 DISK_DIAMETER_MM = 80.0
 
-# Stable color -> ID mapping (your requirement)
+# disk_tracks.csv layout (pixel columns let the overlay be rendered later from the CSV alone)
+CSV_COLUMNS = [
+    "frame", "disk_id",
+    "cx_mm", "cy_mm",
+    "mx_mm", "my_mm",
+    "r_px", "marker_color",
+    "cx_px", "cy_px",
+    "mx_px", "my_px",
+]
+
+# Stable color -> ID mapping (your requirement); one disk per colour, add a colour here and in MARKER_COLORS
 COLOR_ID_MAP = {"green": 0, "blue": 1}
 ALL_IDS = sorted(COLOR_ID_MAP.values())  # [0,1]
+TRACKER = "kalman" # "kalman": Kalman prediction + Hungarian assignment (tracker.py, N disks); "greedy": IDAssigner
+
+
+class AnalysisCancelled(Exception):
+    """Raised by main when its `cancel` event is set (partial outputs are removed)."""
 
 
 class IDAssigner:
@@ -44,6 +93,9 @@ class IDAssigner:
     def __init__(self, color_id_map):
         self.color_id_map = {k.lower(): v for k, v in color_id_map.items()}
         self.prev_pos = {}  # id -> (x, y)
+        self.prev_vel = {}  # id -> (vx, vy) in px/frame
+        self.prev_radius = {}  # id -> radius in px
+        self.last_ids = set()  # ids assigned on the last frame
 
     @staticmethod
     def _dist(a, b):
@@ -103,170 +155,544 @@ class IDAssigner:
             for (ri, rd), pid in zip(remaining_dets_sorted, remaining_ids_sorted):
                 assigned[pid] = rd
 
-        # 4) Update history
+        # 4) Update history (velocity only between consecutive frames)
         for pid, d in assigned.items():
+            if pid in self.last_ids:
+                px, py = self.prev_pos[pid]
+                self.prev_vel[pid] = (d["center"][0] - px, d["center"][1] - py)
+            else:
+                self.prev_vel[pid] = (0.0, 0.0)
             self.prev_pos[pid] = d["center"]
+            self.prev_radius[pid] = d["radius"]
+        self.last_ids = set(assigned.keys())
 
         # Return in a stable order [0,1] if present
         return [(pid, assigned[pid]) for pid in sorted(assigned.keys())]
 
+    def predict(self):
+        """
+        Constant-velocity guess for every ID assigned on the last frame.
+        returns: list of (x, y, radius) in pixels
+        """
+        preds = []
+        for pid in sorted(self.last_ids):
+            (x, y), (vx, vy) = self.prev_pos[pid], self.prev_vel[pid]
+            preds.append((x + vx, y + vy, self.prev_radius[pid]))
+        return preds
 
-def info(info_type, message):
-    print(f"[{info_type}] {message}")
 
+def make_assigner():
+    # ID assigner selected by TRACKER (both expose assign() and predict())
+    if TRACKER == "greedy":
+        return IDAssigner(COLOR_ID_MAP)
+    return tkr.MultiDiskTracker(COLOR_ID_MAP)
 
-def main(video_path, bg_path, dtc_path, csv_path, fps_eff):
-    
-    # 1) Average background from a clean interval at the beggining of the filming
-    bg_path = prp.estimate_background_median(
-        video_path         = video_path,
-        clean_seconds      = CLEAN_SECONDS,
-        frame_sample_limit = FRAME_LIMIT_AVG,
-        blur_kernel        = BLUR_KERNEL,
-        output_path        = bg_path,
-        return_image       = False
-    )
-    background = cv2.imread(bg_path)
 
-    if background is None:
-        raise RuntimeError(f"Failed to load background at {bg_path}") # Error checking --> fatal program will end
+def marker_lut():
+    # Lookup table for MARKER_COLORS (None when disabled)
+    global _marker_lut
+    if MARKER_LUT_BITS is None:
+        return None
+    if _marker_lut is None or _marker_lut.bits != MARKER_LUT_BITS:
+        _marker_lut = prp.MarkerColorLUT(MARKER_COLORS, MARKER_LUT_BITS)
+    return _marker_lut
 
-    info("Done", "Background Averaged")
-    
-    # 2) Open video
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise IOError(f"Cannot open video {video_path}")  # Error checking --> fatal program will end
 
-    # Gets FPS (crucial for velocities, linear and angular)
-    fps = min([30, 60], key=lambda x: abs(x - fps_eff))
-    info("Info", f"FPS: {fps:.2f}")
-    dt  = 1.0 / fps if fps > 0 else 1/30  # Time elapsed per frame
-    info("Info", f"Per frame time: {dt:.4f}s")
+def info(info_type, message):
+    print(f"[{info_type}] {message}")
 
-    # Variables, list of arrays for detections (each indice has a list with values of possible disk detections)
-    scale_mm_per_px = None
-    all_detections = []  # each entry: [frame, disk_id, cx_mm, cy_mm, mx_mm, my_mm, r_px]
-    frame_idx = 0
-    assigner = IDAssigner(COLOR_ID_MAP)
-    
-    # before the loop, open the writer
-    w   = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h   = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = cv2.VideoWriter(dtc_path, fourcc, fps, (w, h))
+def detect_frame(frame, background, ctx, lut=None, predictions=None, background_small=None, prof=prf.NULL_PROFILER):
+    """
+    Segmentation + marker detection for one frame (no drawing, no IDs).
+    predictions: tracker (x, y, r) guesses for ROI segmentation, or None for a full scan.
+    prof: profiler.StageProfiler timing the "segment" and "marker" stages.
+    returns: list of dicts with center, radius, marker_center, marker_color
+    """
+    with prof.stage("segment"):
+        disks = _segment_frame(frame, background, ctx, predictions, background_small)
+
+    with prof.stage("marker"):
+        return _frame_markers(frame, disks, ctx, lut)
 
-    # 3) Main loop --> through each frame
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
 
-        # 4) Segment disks
+def _segment_frame(frame, background, ctx, predictions, background_small):
+    # 4) Segment disks --> around the predicted positions if every disk is tracked, else full frame
+    disks = None
+    if predictions:
+        disks = prp.segment_disks_roi(
+            frame, background, predictions,
+            thresh_val=50,
+            morph_kernel=(5,5),
+            min_radius=10, max_radius=200,
+            pad_factor=ROI_PAD_FACTOR,
+            ctx=ctx
+        )
+    if disks is None and PYRAMID_SCALE:
+        disks = prp.segment_disks_pyramid(
+            frame, background,
+            scale=PYRAMID_SCALE,
+            thresh_val=50,
+            morph_kernel=(5,5),
+            min_radius=10, max_radius=200,
+            background_small=background_small,
+            ctx=ctx
+        )
+    elif disks is None:
         disks = prp.segment_disks(
             frame, background,
             thresh_val=50,
             morph_kernel=(5,5),
-            min_radius=10, max_radius=200
+            min_radius=10, max_radius=200,
+            ctx=ctx
         )
+    return disks
+
 
+def _frame_markers(frame, disks, ctx, lut):
+    # 6) Build per-disk detections with marker color
+    frame_dets = []
+    for d in disks:
+        cx_px, cy_px = d["center"]
+        r_px = float(d["radius"])
+
+        # Find the offset mark and its colour (every colour of MARKER_COLORS in one pass)
+        found = prp.detect_marker(frame, (cx_px, cy_px), r_px, MARKER_COLORS, ctx=ctx, lut=lut)
+        mark = found[0] if found is not None else None
+
+        # 8 Append this disk detection in a conventional way --> further usefull for CSV or Excel Export
+        frame_dets.append({
+            "center": (float(cx_px), float(cy_px)),
+            "radius": r_px,
+            "marker_center": None if mark is None else (float(mark[0]), float(mark[1])),
+            "marker_color": found[1] if found is not None else None
+        })
+    return frame_dets
+
+
+class TrackBuilder:
+    """
+    In-order stage of the detector: stable IDs (make_assigner), pixel -> mm scale
+    from the first detected disk, and the rows of disk_tracks.csv streamed to
+    `writer` (a tracks.TrackWriter; None only keeps the tracker state).
+    `prof` times the "assign" and "write" stages.
+    """
+    def __init__(self, writer=None, prof=prf.NULL_PROFILER):
+        self.assigner = make_assigner()
+        self.scale_mm_per_px = None
+        self.writer = writer
+        self.prof = prof
+        self.count = 0  # rows written
+
+    def predict(self, frame_idx):
+        # ROI predictions when every disk is tracked (a full scan every FULL_SCAN_INTERVAL frames)
+        predictions = self.assigner.predict()
+        if ROI_TRACKING and len(predictions) == len(ALL_IDS) and frame_idx % FULL_SCAN_INTERVAL:
+            return predictions
+        return None
+
+    def add(self, frame_idx, frame_dets):
         # 5) Compute scale on first detection (use first disk)
-        if scale_mm_per_px is None and disks:
-            first_rpx = float(disks[0]["radius"])
+        if self.scale_mm_per_px is None and frame_dets:
+            first_rpx = float(frame_dets[0]["radius"])
             if first_rpx > 0:
-                scale_mm_per_px = DISK_DIAMETER_MM / (2.0 * first_rpx)
-                info("Info", f"Computed scale: {scale_mm_per_px:.3f} mm/px")
-
-
-        # 6) Build per-disk detections with marker color
-        frame_dets = []
-        for d in disks:
-            cx_px, cy_px = d["center"]
-            r_px = float(d["radius"])
-
-            # Try to find the green disk
-            mark = prp.detect_marker_center(frame, (cx_px, cy_px), r_px, GREEN_LOWER, GREEN_UPPER)
-            marker_color = None
-            
-            if mark is not None:
-                marker_color = "green"
-            
-            else:
-                # Try blue if green not found
-                mark = prp.detect_marker_center(frame, (cx_px, cy_px), r_px, BLUE_LOWER, BLUE_UPPER)
-                
-                if mark is not None:
-                    marker_color = "blue"
-
-            
-            # 7) Drawing (disk & marker) on the original video
-            cv2.circle(frame, (int(cx_px), int(cy_px)), int(r_px), (0, 255, 0), 2)
-            cv2.circle(frame, (int(cx_px), int(cy_px)), 4, (0, 0, 255), -1)
-            if mark is not None:
-                mx_px, my_px = int(mark[0]), int(mark[1])
-                cv2.circle(frame, (mx_px, my_px), 4, (0, 0, 255), -1)
-            else:
-                mx_px = my_px = None
-
-            # 8 Append this disk detection in a conventional way --> further usefull for CSV or Excel Export
-            frame_dets.append({
-                "center": (float(cx_px), float(cy_px)),
-                "radius": r_px,
-                "marker_center": None if mark is None else (float(mark[0]), float(mark[1])),
-                "marker_color": marker_color
-            })
+                self.scale_mm_per_px = DISK_DIAMETER_MM / (2.0 * first_rpx)
+                info("Info", f"Computed scale: {self.scale_mm_per_px:.3f} mm/px")
 
         # Assign stable IDs (0/1) for this frame --> usefull if a marker not found (continuity)
-        assigned = assigner.assign(frame_dets)
+        with self.prof.stage("assign"):
+            assigned = self.assigner.assign(frame_dets)
 
         # 9) Save to CSV (mm units for centers & marker)
+        scale = self.scale_mm_per_px
+        if scale is None or self.writer is None:
+            return
+        with self.prof.stage("write"):
+            self._write(frame_idx, assigned, scale)
+
+    def _write(self, frame_idx, assigned, scale):
         for puck_id, det in assigned:
             cx_px, cy_px = det["center"]
-            r_px = det["radius"]
-            if scale_mm_per_px is None:
-                continue
-            cx_mm = cx_px * scale_mm_per_px
-            cy_mm = cy_px * scale_mm_per_px
-
             if det["marker_center"] is not None:
                 mx_px, my_px = det["marker_center"]
-                mx_mm = mx_px * scale_mm_per_px
-                my_mm = my_px * scale_mm_per_px
+                mx_mm, my_mm = mx_px * scale, my_px * scale
             else:
-                mx_mm = my_mm = None
+                mx_px = my_px = mx_mm = my_mm = None
 
-            all_detections.append([
+            self.count += 1
+            self.writer.write_row([
                 frame_idx, puck_id,
-                cx_mm, cy_mm,
+                cx_px * scale, cy_px * scale,
                 mx_mm, my_mm,
-                r_px,
-                det["marker_color"]
+                det["radius"],
+                det["marker_color"],
+                cx_px, cy_px,
+                mx_px, my_px
             ])
 
-        # 10) Write the frame down
-        out.write(frame)
 
+def _iter_serial(cap, background, background_small, lut, tracks, prof=prf.NULL_PROFILER, start=0):
+    # One thread: decode, then detect with ROI predictions from the tracker state (cap positioned at `start`)
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    ctx = prp.ProcessingContext((h, w)) # reusable buffers, kernels, CLAHE and disk masks
+    frame_idx = start
+    while True:
+        with prof.stage("decode"):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        predictions = tracks.predict(frame_idx) # after the previous frame was added
+        yield frame, detect_frame(frame, background, ctx, lut, predictions, background_small, prof)
+        frame_idx += 1
+
+
+def _iter_pipelined(cap, background, background_small, lut, workers, queue_size, prof=prf.NULL_PROFILER):
+    """
+    Decoder thread -> pool of detection workers -> frames yielded in order.
+    The decoder submits every frame to the pool and queues (frame, future) in
+    decode order on a bounded queue, so the consumer (annotator/encoder) gets
+    results in frame order and at most `queue_size` frames are in flight.
+    Workers do full/pyramid scans only (ROI predictions need the in-order state).
+    """
+    local = threading.local() # one ProcessingContext per worker thread
+    pending = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def work(frame):
+        ctx = getattr(local, "ctx", None)
+        if ctx is None:
+            ctx = local.ctx = prp.ProcessingContext(frame.shape)
+        return detect_frame(frame, background, ctx, lut, None, background_small, prof)
+
+    def decode(pool):
+        try:
+            while not stop.is_set():
+                with prof.stage("decode"):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                pending.put((frame, pool.submit(work, frame)))
+        except Exception as exc:
+            pending.put(exc)
+        finally:
+            pending.put(None)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detect") as pool:
+        decoder = threading.Thread(target=decode, args=(pool,), name="decode", daemon=True)
+        decoder.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                frame, fut = item
+                yield frame, fut.result()
+        finally:
+            # Unblock and stop the decoder if the consumer ended early
+            stop.set()
+            while decoder.is_alive():
+                try:
+                    pending.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            decoder.join()
+
+
+def _detect_chunk(video_path, bg_path, start, stop, profile=False):
+    """
+    Worker process: detections for frames [start, stop) (stop=None -> end of video).
+    Uses the background saved at bg_path and a chunk-local IDAssigner only for
+    ROI predictions; the final IDs are given by the parent in frame order.
+    returns: (start, list of frame_dets, profiler samples or None)
+    """
+    prof = prf.StageProfiler() if profile else prf.NULL_PROFILER
+    background = cv2.imread(str(bg_path))
+    if background is None:
+        raise RuntimeError(f"Failed to load background at {bg_path}")
+    background_small = None
+    if PYRAMID_SCALE:
+        background_small = cv2.resize(background, None, fx=PYRAMID_SCALE, fy=PYRAMID_SCALE, interpolation=cv2.INTER_LINEAR)
 
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+            cap.release()
+            raise IOError(f"Cannot seek to frame {start} of {video_path} (use CHUNK_PROCESSES = 0)")
+
+    ctx = prp.ProcessingContext(background.shape)
+    lut = marker_lut()
+    local = TrackBuilder() # predictions only
+    results = []
+    frame_idx = start
+    try:
+        while stop is None or frame_idx < stop:
+            with prof.stage("decode"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            predictions = local.predict(frame_idx) if frame_idx > start else None
+            frame_dets = detect_frame(frame, background, ctx, lut, predictions, background_small, prof)
+            local.assigner.assign(frame_dets)
+            results.append(frame_dets)
+            frame_idx += 1
+    finally:
+        cap.release()
+    return start, results, (prof.samples() if profile else None)
+
+
+def _detect_chunked(video_path, bg_path, n_frames, processes, prof=prf.NULL_PROFILER, start=0, stop=None):
+    """
+    Split [start, stop) into ranges, run _detect_chunk on a ProcessPoolExecutor
+    and yield (frame index, detections) in frame order. With stop=None the
+    frames up to n_frames are split and the last range reads to the end of the
+    video, in case the container frame count is short. Only the last range may
+    come back short: a missing frame anywhere else (decode error, overstated
+    frame count) would shift every later index, so it raises instead.
+    Stage timings of the workers are merged into `prof`.
+    """
+    n_chunks = max(1, processes * CHUNKS_PER_PROCESS)
+    end = stop if stop is not None else max(n_frames, start + n_chunks)
+    n_chunks = max(1, min(n_chunks, end - start))
+    bounds = np.linspace(start, end, n_chunks + 1, dtype=int)
+    ranges = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+    ranges[-1] = (ranges[-1][0], stop)
+
+    pool = ProcessPoolExecutor(max_workers=processes)
+    try:
+        futures = [pool.submit(_detect_chunk, str(video_path), str(bg_path), a, b, prof.enabled) for a, b in ranges]
+        for (a, b), fut in zip(ranges, futures):
+            chunk_start, chunk, samples = fut.result()
+            if samples:
+                prof.merge(samples)
+            if b is not None and len(chunk) != b - a:
+                raise RuntimeError(f"Chunk {a}-{b - 1} returned {len(chunk)} frames instead of {b - a} "
+                                   f"(use CHUNK_PROCESSES = 0)")
+            yield from enumerate(chunk, chunk_start)
+    finally:
+        # Consumer stopped early (cancel/error) --> drop the chunks not started yet
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _locate_collision(cap, background, background_small, stride, tick=None, start=0, stop=None):
+    """
+    Cheap first pass of the adaptive mode: every frame of [start, stop) is
+    grabbed but only one out of `stride` is decoded and segmented (no markers,
+    no IDs). The collision is the sampled frame where two disks are closest.
+    cap must be positioned at `start`; stop=None scans to the end.
+    tick: called once per frame (progress/cancellation).
+    returns: (collision frame or None if two disks were never in view, index after the last frame read)
+    """
+    ctx = prp.ProcessingContext(background.shape)
+    best, best_dist = None, float("inf")
+    frame_idx = start
+    while (stop is None or frame_idx < stop) and cap.grab():
+        if (frame_idx - start) % stride == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            disks = _segment_frame(frame, background, ctx, None, background_small)
+            if len(disks) == 2:
+                (x0, y0), (x1, y1) = disks[0]["center"], disks[1]["center"]
+                dist = math.hypot(x1 - x0, y1 - y0)
+                if dist < best_dist:
+                    best, best_dist = frame_idx, dist
+        if tick is not None:
+            tick()
         frame_idx += 1
+    return best, frame_idx
 
-    cap.release()
-    out.release()
 
-    # 7) Dump CSV
-    with open(csv_path, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "frame", "disk_id",
-            "cx_mm", "cy_mm",
-            "mx_mm", "my_mm",
-            "r_px", "marker_color"
-        ])
-        writer.writerows(all_detections)
+def main(video_path, bg_path, dtc_path, csv_path, fps_eff, npz_path=None, progress=None, cancel=None, profile=None):
+    """
+    Full analysis of a recording: background, detection, disk_tracks.csv (+ .npz)
+    and the optional overlay video.
+
+    progress: called as progress(frames_done, n_frames) after every frame
+              (n_frames = 0 when the container does not report a frame count;
+              in ADAPTIVE/TRIM_IDLE mode the cheap passes and the window are all counted).
+    cancel:   threading.Event; when set, the run stops at the next frame, the
+              partial track files are deleted and AnalysisCancelled is raised
+              (any other error also deletes them; the previous files are kept).
+    profile:  time every stage and save <csv stem>_profile.json next to the CSV
+              (None -> PROFILE).
+    returns:  the profile report (dict) when profiling, else None
+    """
+    if profile is None:
+        profile = PROFILE
+    prof = prf.StageProfiler() if profile else prf.NULL_PROFILER
+    
+    # 1) Average background from a clean interval at the beggining of the filming (cached per video + parameters)
+    with prof.stage("background"):
+        background = bgc.load_background(
+            video_path,
+            bg_path,
+            clean_seconds      = CLEAN_SECONDS,
+            frame_sample_limit = FRAME_LIMIT_AVG,
+            blur_kernel        = BLUR_KERNEL,
+            sampling           = BG_SAMPLING,
+            estimator          = BG_ESTIMATOR,
+            workers            = BG_WORKERS
+        )
 
-    info("Done", f"Saved {len(all_detections)} detections to disk_tracks.csv")
-    return
+    if background is None:
+        raise RuntimeError(f"Failed to load background at {bg_path}") # Error checking --> fatal program will end
 
+    info("Done", "Background Averaged")
+    if cancel is not None and cancel.is_set():
+        raise AnalysisCancelled("Analysis cancelled")
+
+    # Coarse level of the background for the pyramid full scans
+    background_small = None
+    if PYRAMID_SCALE:
+        background_small = cv2.resize(background, None, fx=PYRAMID_SCALE, fy=PYRAMID_SCALE, interpolation=cv2.INTER_LINEAR)
+    
+    # 2) Open video
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")  # Error checking --> fatal program will end
 
+    # Gets FPS (crucial for velocities, linear and angular)
+    fps = min([30, 60], key=lambda x: abs(x - fps_eff))
+    info("Info", f"FPS: {fps:.2f}")
+    dt  = 1.0 / fps if fps > 0 else 1/30  # Time elapsed per frame
+    info("Info", f"Per frame time: {dt:.4f}s")
 
+    lut = marker_lut()
 
+    # Variables: in-order ID/scale state, rows streamed to the CSV (and the typed .npz when asked)
+    # under temporary names --> renamed only once the whole video is analysed (a failed run keeps the old files)
+    outputs = [Path(p) for p in (csv_path, npz_path) if p is not None]
+    parts = [p.with_name(f"{p.stem}.part{p.suffix}") for p in outputs]
+    writers = [trk.open_track_writer(p, CSV_COLUMNS) for p in parts]
+    tracks = TrackBuilder(trk.MultiTrackWriter(writers), prof)
+    
+    n_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    start, stop = 0, None # frames analysed at full fidelity (stop=None -> end of video)
+
+    done = 0
+    total = n_frames
+    t_frame = time.perf_counter()
+
+    def tick():
+        # Cancellation point + progress report, once per frame read
+        nonlocal done
+        if cancel is not None and cancel.is_set():
+            raise AnalysisCancelled("Analysis cancelled")
+        done += 1
+        if progress is not None:
+            progress(done, total)
+
+    def frame_done(frame_idx):
+        # Once per analysed frame, in frame order
+        nonlocal t_frame
+        if prof.enabled:
+            now = time.perf_counter()
+            prof.add("frame", now - t_frame) # consumer-side time per frame (throughput)
+            t_frame = now
+        tick()
+
+    # 3-7) Rows are flushed to disk while the video is processed
+    try:
+        # 2a) Idle trimming --> motion-energy index (cached next to the video), then only the moving frames
+        if TRIM_IDLE:
+            total = 2 * n_frames # estimate until the interval is known
+            with prof.stage("activity"):
+                index = act.load_index(video_path, fps, TRIM_MARGIN_S, tick)
+            if index["start"] is None:
+                info("Warn", "Trim: nothing moves, analysing every frame")
+            else:
+                start, stop = index["start"], index["stop"]
+                info("Info", f"Trim: motion in frames {start}-{stop - 1} of {index['frames']}")
+            total = done + (stop if stop is not None else n_frames) - start
+            prof.meta.update(trim={"start": start, "stop": stop})
+            t_frame = time.perf_counter()
+
+        # 2b) Adaptive mode --> cheap pass for the collision, then only a window around it
+        if ADAPTIVE:
+            margin = max(int(round(ADAPTIVE_MARGIN_S * fps)), 2 * ADAPTIVE_STRIDE)
+            span = (stop if stop is not None else n_frames) - start
+            total = done + span + min(span, 2 * margin + 1) # estimate until the window is known
+            if start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            with prof.stage("locate"):
+                cf, n_read = _locate_collision(cap, background, background_small, ADAPTIVE_STRIDE, tick, start, stop)
+            if cf is None:
+                info("Warn", "Adaptive: two disks never in view, analysing every frame")
+            else:
+                start, stop = max(cf - margin, start), min(cf + margin + 1, n_read)
+                info("Info", f"Adaptive: collision near frame {cf}, analysing frames {start}-{stop - 1}")
+            total = done + (stop if stop is not None else n_read) - start
+            prof.meta.update(adaptive={"collision_estimate": cf, "start": start, "stop": stop})
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            t_frame = time.perf_counter()
+        elif start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+        # 3a) Chunked mode --> frame ranges on worker processes, stitched in frame order
+        if CHUNK_PROCESSES:
+            cap.release()
+            info("Info", f"Chunks: {CHUNK_PROCESSES} processes")
+            prof.meta.update(mode="chunked", workers=CHUNK_PROCESSES)
+            chunks = _detect_chunked(video_path, bg_path, n_frames, CHUNK_PROCESSES, prof, start, stop)
+            try:
+                for frame_idx, frame_dets in chunks:
+                    tracks.add(frame_idx, frame_dets)
+                    frame_done(frame_idx)
+            finally:
+                chunks.close()
+
+        else:
+            # 3) Main loop --> through each frame (serial, or decode/detect on other threads)
+            if PIPELINE_WORKERS:
+                info("Info", f"Pipeline: {PIPELINE_WORKERS} detection workers")
+                prof.meta.update(mode="pipelined", workers=PIPELINE_WORKERS)
+                frames = _iter_pipelined(cap, background, background_small, lut, PIPELINE_WORKERS, PIPELINE_QUEUE, prof)
+            else:
+                prof.meta.update(mode="serial", workers=0)
+                frames = _iter_serial(cap, background, background_small, lut, tracks, prof, start)
+
+            try:
+                for frame_idx, (frame, frame_dets) in enumerate(frames, start):
+                    if stop is not None and frame_idx >= stop:
+                        break
+                    tracks.add(frame_idx, frame_dets)
+                    frame_done(frame_idx)
+            finally:
+                frames.close()
+                cap.release()
+        tracks.writer.close()
+    except BaseException as exc:
+        # Cancelled or failed: never leave a partial disk_tracks behind (it would look like a finished run)
+        try:
+            tracks.writer.close()
+        finally:
+            for p in parts:
+                p.unlink(missing_ok=True)
+        if isinstance(exc, AnalysisCancelled):
+            info("Info", "Analysis cancelled")
+        raise
+    for part, out in zip(parts, outputs):
+        os.replace(part, out)
+
+    info("Done", f"Saved {tracks.count} detections to disk_tracks.csv")
+
+    # 8) Optional overlay video --> separate stage, rendered from the CSV (never during analysis)
+    if dtc_path is not None:
+        render.render_overlay(video_path, csv_path, dtc_path, fps=fps, prof=prof)
+        info("Done", f"Rendered overlay to {Path(dtc_path).name}")
+
+    # 10) Profile report next to the CSV
+    if not prof.enabled:
+        return None
+    frames_done = len(prof.samples().get("frame", []))
+    prof.meta.update(video=str(video_path), frames=frames_done)
+    csv_p = Path(csv_path)
+    report = prof.save(csv_p.with_name(f"{csv_p.stem}_profile.json"))
+    info("Info", f"Profile: {prf.StageProfiler.summary(report)}")
+    return report
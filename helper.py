@@ -1,8 +1,6 @@
 from pathlib import Path
 import sys
 import os
-import detector as dtc
-import Post_process as ptp
 from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import Qt
 
@@ -50,10 +48,19 @@ def on_record(controller):
     controller.btnRecord.setEnabled(False)
     controller.btnStop.setEnabled(True)
     controller.btnNext4.setEnabled(False)
+    if controller.worker.trigger_pending():
+        controller.statusBar().showMessage("Armed: recording starts when the disks move (Stop saves the last seconds)")
     return
 
 
 def on_stop(controller):
+    # Pre-trigger Record: Stop triggers/ends it, the file is closed after the post-roll (recording_saved)
+    if hasattr(controller, "worker") and controller.worker.trigger_pending():
+        controller.worker.stop_record()
+        controller.btnStop.setEnabled(False)
+        controller.statusBar().showMessage("Saving recording (post-roll)...")
+        return
+
     # Stop Record if UP
     if hasattr(controller, "worker") and controller.worker.isRunning():
         controller.worker.stop_record()
@@ -67,6 +74,15 @@ def on_stop(controller):
     return
 
 
+def recording_saved(controller, path):
+    # Pre-trigger Record closed by the camera thread (motion stopped or Stop + post-roll)
+    controller.btnRecord.setEnabled(True)
+    controller.btnStop.setEnabled(False)
+    controller.btnNext4.setEnabled(True)
+    controller.statusBar().showMessage(f"Recording saved: {Path(path).name}", 5000)
+    print("[INFO] Recording Stopped")
+
+
 def validate_input(group, massB, massG, radiusB, radiusG):
     # Check the Input Values
     message = ""
@@ -142,28 +158,60 @@ def validator(self):
 
 
 def generate(self):
+    # btnGen toggles: Generate --> starts the analysis job, Cancel --> stops it
+    if self.analysis_running():
+        self.btnGen.setEnabled(False) # re-enabled once the job has stopped
+        self.analysis.cancel()
+        return
+
     video_path = self.worker._path
     parent_path = self.worker._path.parent
     self.parent_path = parent_path
-    bg_path = parent_path / "table_background.png"
-    detection_video_path = parent_path /"detection.mp4"
-    csv_path = parent_path / "disk_tracks.csv"
-    
-    dtc.main(video_path, bg_path, detection_video_path, csv_path, self.worker.fps_eff)
-    self.btnPreview.setEnabled(True)
+
+    # Experimental Values Logic (validated on page 3)
+    masses = (float(self.green_mass_val.text()), float(self.blue_mass_val.text()))
+    radius = (float(self.green_rad_val.text()), float(self.blue_rad_val.text()))
+
+    # Button Logic
+    self._gen_text = self.btnGen.text()
+    self.btnGen.setText("Cancel")
+    self.btnPreview.setEnabled(False)
+    self.btnRedo.setEnabled(False)
+    self.btnNext5.setEnabled(False)
+
+    # Detection + post-processing off the GUI thread (app.AnalysisWorker)
+    self.start_analysis(video_path, parent_path, self.worker.fps_eff, masses, radius)
     return
 
 
+def analysis_done(self, collision_frame):
+    # Analysis job finished: trajectories.png and data.xlsx are ready
+    self.analysis.wait() # run() is returning --> btnGen must not see it as running
+    self._progress.setVisible(False)
+    msg = f"Analysis done | collision at frame {collision_frame}"
+    if self.analysis.profile_summary:
+        msg += f" | profile {self.analysis.profile_summary}" # detector.PROFILE --> disk_tracks_profile.json
+    self._sb.showMessage(msg, 5000)
+    self.btnGen.setText(self._gen_text)
+    self.btnGen.setEnabled(False)
+    self.btnPreview.setEnabled(True)
+
+
+def analysis_stopped(self, message):
+    # Analysis job cancelled or failed: allow a new run or a new recording
+    print(f"[INFO] {message}")
+    self.analysis.wait()
+    self._progress.setVisible(False)
+    self._sb.showMessage(message, 5000)
+    self.btnGen.setText(self._gen_text)
+    self.btnGen.setEnabled(True)
+    self.btnRedo.setEnabled(True)
+
+
 def preview(self):
     
-    # Path Logic
-    csv_path = self.parent_path / "disk_tracks.csv" #########
+    # Path Logic (image drawn by the analysis job)
     output_path = self.parent_path / "trajectories.png"
-    fps = self.worker.fps_eff
-    
-    # Trajectories Function Call
-    #csv_path = "C:/Users/gonca/Desktop/disk_tracks.csv" ##### Delete when done ########
-    ptp.visualize_trajectories(csv_path, output_path, fps, show_equal_aspect=True)
     
     # Label Preview
     self.detectionLabel.setScaledContents(False)
@@ -173,23 +221,7 @@ def preview(self):
 
 
 def genData(self):
-    # Path Logic
-    csv_path = self.parent_path / "disk_tracks.csv" ###########
-    output_path = self.parent_path / "data.xlsx"
-    fps = self.worker.fps_eff
-    
-    # Experimental Values Logic
-    green_mass_val = float(self.green_mass_val.text())
-    blue_mass_val = float(self.blue_mass_val.text())
-    green_rad_val = float(self.green_rad_val.text())
-    blue_rad_val = float(self.blue_rad_val.text())
-    
-    masses = (green_mass_val, blue_mass_val)
-    radius = (green_rad_val, blue_rad_val)
-    
-    # Data Generation 
-    #csv_path = "C:/Users/gonca/Desktop/disk_tracks.csv" ###### Delete when Done ####
-    ptp.build_student_excel(csv_path, output_path, masses, radius, fps, include_metrics=True)
+    # data.xlsx is written by the analysis job
     
     # Button Arithmetic
     self.btnPreview.setEnabled(False)
@@ -1,5 +1,8 @@
+import multiprocessing
+
 import app
 
 # Initialize Everything Starting on the GUI --> Create executable for this file
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # worker processes of the chunked detector in the frozen build
     app.main()
\ No newline at end of file
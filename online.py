@@ -0,0 +1,190 @@
+'''
+Online detection
+Analyses the camera frames while they are being recorded: the background is
+the median of the first CLEAN_SECONDS (same estimator as on the file), then
+every frame goes through detector.detect_frame and the TrackBuilder, so
+disk_tracks.csv/.npz are complete the moment recording stops (no second decode)
+
+'''
+
+import itertools
+import queue
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import Pre_process as prp
+import detector as dtc
+import tracks as trk
+
+
+ONLINE_QUEUE = 32 # frames waiting for the detection thread (newer frames are dropped when full)
+_END = object() # queue sentinel pushed by finish()
+
+
+class OnlineDetector:
+    """
+    Detection thread fed by the capture loop.
+
+      1) frames of the clean interval (first CLEAN_SECONDS at `fps`) are sampled
+         into Pre_process.median_background --> table_background.png
+      2) every later frame: detect_frame (ROI tracking as in the serial loop)
+         + TrackBuilder --> disk_tracks.csv (+ .npz) in `folder`
+
+    push() never blocks the capture loop: when the detector falls behind by
+    ONLINE_QUEUE frames the newest frame is dropped (frame indices still follow
+    the recording). A drop next to a frame with disks in view makes the run
+    incomplete and the recording must be analysed offline (detector.main);
+    drops while the table is empty lose nothing. The clean interval itself is
+    not searched for disks (it must show the empty table anyway).
+
+    Usage (capture thread):
+        online = OnlineDetector(folder, fps); online.start()
+        online.push(frame)   # every recorded frame
+        summary = online.finish()
+    """
+    def __init__(self, folder, fps, npz=True, queue_size=ONLINE_QUEUE):
+        folder = Path(folder)
+        self.bg_path = folder / "table_background.png"
+        self.csv_path = folder / "disk_tracks.csv"
+        self.npz_path = folder / "disk_tracks.npz" if npz else None
+        self.fps = float(fps)
+        self.received = 0 # frames pushed (= frames in the recording)
+        self.dropped = 0
+        self.analysed = 0
+        self.unsafe_gaps = 0 # gaps bordered by a frame with disks
+        self.rows = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread = threading.Thread(target=self._run, name="online-detector", daemon=True)
+        self._closed = False
+
+    def start(self):
+        self._thread.start()
+
+    def push(self, frame) -> bool:
+        # Capture thread: hand over one recorded frame; False when it was dropped
+        if self._closed:
+            return False
+        idx = self.received
+        self.received += 1
+        try:
+            self._queue.put_nowait((idx, frame))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def finish(self, timeout=None) -> dict:
+        """
+        End of recording: analyse the frames still queued, close the track files.
+        returns: summary (frames, analysed, dropped, rows, complete, finish_s)
+        """
+        t = time.perf_counter()
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_END) # the thread drains the queue even after an error
+        self._thread.join(timeout)
+        return {
+            "frames": self.received,
+            "analysed": self.analysed,
+            "dropped": self.dropped,
+            "rows": self.rows,
+            "complete": self.complete,
+            "finish_s": round(time.perf_counter() - t, 3),
+        }
+
+    @property
+    def complete(self) -> bool:
+        # Tracks equivalent to an offline run of the recording
+        return (not self._thread.is_alive() and self.error is None and self.rows > 0
+                and self.unsafe_gaps == 0)
+
+    def _frames(self):
+        # (frame index, frame) until finish()
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            yield item
+
+    def _run(self):
+        frames = self._frames()
+        try:
+            n_clean = max(1, int(self.fps * dtc.CLEAN_SECONDS))
+            background, first = self._background(frames, n_clean)
+            if background is None:
+                dtc.info("Warn", "Online: recording shorter than the clean interval, no tracks")
+                return
+            self._detect(itertools.chain([first] if first else [], frames), background, n_clean)
+        except Exception as exc:
+            self.error = exc
+            dtc.info("Warn", f"Online detection stopped: {exc}")
+        finally:
+            for _ in frames: # unblock finish() whatever happened
+                pass
+
+    def _background(self, frames, n_clean):
+        # 1) Same samples as Pre_process._iter_sampled_frames on the clean interval of the file
+        num_samples = min(dtc.FRAME_LIMIT_AVG, n_clean)
+        wanted = np.bincount(np.linspace(0, n_clean - 1, num_samples, dtype=int), minlength=n_clean)
+        first = None # first frame after the clean interval, if reached
+
+        def clean_samples():
+            nonlocal first
+            for idx, frame in frames:
+                if idx >= n_clean:
+                    first = (idx, frame)
+                    return
+                for _ in range(wanted[idx]):
+                    yield frame
+
+        n_read, background = prp.median_background(
+            clean_samples(), num_samples, dtc.BLUR_KERNEL,
+            estimator=dtc.BG_ESTIMATOR, workers=dtc.BG_WORKERS
+        )
+        if background is None:
+            return None, None
+        if n_read < num_samples:
+            dtc.info("Warn", f"Online: background from {n_read} / {num_samples} frames (dropped)")
+        cv2.imwrite(str(self.bg_path), background)
+        dtc.info("Done", "Online: background averaged")
+        return background, first
+
+    def _detect(self, frames, background, n_clean):
+        # 2) Serial detection loop of detector.main, fed by the queue
+        background_small = None
+        if dtc.PYRAMID_SCALE:
+            background_small = cv2.resize(background, None, fx=dtc.PYRAMID_SCALE, fy=dtc.PYRAMID_SCALE,
+                                          interpolation=cv2.INTER_LINEAR)
+        ctx = prp.ProcessingContext(background.shape[:2])
+        lut = dtc.marker_lut()
+
+        writers = [trk.open_track_writer(self.csv_path, dtc.CSV_COLUMNS)]
+        if self.npz_path is not None:
+            writers.append(trk.open_track_writer(self.npz_path, dtc.CSV_COLUMNS))
+        tracks = dtc.TrackBuilder(trk.MultiTrackWriter(writers))
+
+        prev_idx, prev_seen = n_clean - 1, False
+        try:
+            for frame_idx, frame in frames:
+                if frame_idx < n_clean:
+                    continue # rest of the clean interval
+                frame_dets = dtc.detect_frame(frame, background, ctx, lut, tracks.predict(frame_idx), background_small)
+                tracks.add(frame_idx, frame_dets)
+                self.analysed += 1
+                self.rows = tracks.count
+
+                # Dropped frames in between only matter if a disk was in view on either side
+                seen = bool(frame_dets)
+                if frame_idx != prev_idx + 1 and (seen or prev_seen):
+                    self.unsafe_gaps += 1
+                prev_idx, prev_seen = frame_idx, seen
+            if prev_seen and prev_idx < self.received - 1:
+                self.unsafe_gaps += 1 # last frames dropped with a disk in view
+        finally:
+            tracks.writer.close()
+        dtc.info("Done", f"Online: {tracks.count} detections, {self.dropped} frames dropped")
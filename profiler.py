@@ -0,0 +1,114 @@
+'''
+Stage profiler
+Opt-in wall-time instrumentation of the analysis stages (decode, segmentation,
+marker detection, ID assignment, track writing, overlay drawing/encoding),
+saved as a JSON report next to disk_tracks.csv
+
+'''
+
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import numpy as np
+
+
+PERCENTILES = (50, 90, 99)
+
+
+class StageProfiler:
+    """
+    Records the wall time of every call of each named stage. Thread-safe: in
+    pipelined mode the segmentation/marker stages are timed on worker threads
+    (their totals can then exceed the run's wall time).
+
+    Usage:
+        with prof.stage("decode"):
+            ret, frame = cap.read()
+    """
+    enabled = True
+
+    def __init__(self):
+        self.meta = {} # run description copied into the report (mode, workers, ...)
+        self._samples = {} # stage -> list of seconds
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+
+    def samples(self) -> dict:
+        # Copy of the raw samples (sent back by chunk worker processes)
+        with self._lock:
+            return {k: list(v) for k, v in self._samples.items()}
+
+    def merge(self, samples: dict):
+        # Samples recorded by another profiler (e.g. a worker process)
+        with self._lock:
+            for name, values in samples.items():
+                self._samples.setdefault(name, []).extend(values)
+
+    def report(self) -> dict:
+        """
+        Per stage: calls, total seconds, share of the wall time, mean and
+        percentiles (ms) of a single call. Per-frame stages are called once
+        per frame, so their percentiles are per-frame percentiles.
+        """
+        wall = time.perf_counter() - self._t0
+        stages = {}
+        for name, values in self.samples().items():
+            ms = np.asarray(values, dtype=float) * 1e3
+            total = float(ms.sum()) / 1e3
+            entry = {
+                "calls": int(ms.size),
+                "total_s": round(total, 6),
+                "share": round(total / wall, 4) if wall > 0 else None,
+                "mean_ms": round(float(ms.mean()), 4),
+            }
+            for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                entry[f"p{p}_ms"] = round(float(v), 4)
+            entry["max_ms"] = round(float(ms.max()), 4)
+            stages[name] = entry
+        stages = dict(sorted(stages.items(), key=lambda kv: -kv[1]["total_s"]))
+        return {"wall_s": round(wall, 6), **self.meta, "stages": stages}
+
+    def save(self, path) -> dict:
+        # Write the JSON report and return it
+        rep = self.report()
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(json.dumps(rep, indent=2))
+        return rep
+
+    @staticmethod
+    def summary(rep: dict, top: int = 4, skip=("frame",)) -> str:
+        # One line for the status bar: the `top` stages by total time ("frame" is the whole loop, not a stage)
+        stages = [(name, s) for name, s in rep["stages"].items() if name not in skip and s["share"] is not None]
+        parts = [f"{name} {100 * s['share']:.0f}%" for name, s in stages[:top]]
+        return f"{rep['wall_s']:.1f}s | " + ", ".join(parts)
+
+
+class _NullProfiler(StageProfiler):
+    # Profiling off: stage() is a shared no-op context, nothing is recorded
+    enabled = False
+    _null = nullcontext()
+
+    def stage(self, name):
+        return self._null
+
+    def add(self, name, seconds):
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
@@ -0,0 +1,185 @@
+'''
+Recording
+Encoder thread between the camera capture loop and cv2.VideoWriter: capture
+only queues frames, a dedicated thread encodes them, so the capture cadence
+(fps_eff) no longer depends on the encoder speed. Pre-trigger ring buffer:
+the last seconds of frames kept in RAM until a trigger starts the recording.
+Latest-frame mailbox for consumers that only want the newest frame (preview)
+
+'''
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+ENCODER_QUEUE = 48 # frames waiting for the encoder (~0.8 s at 60 fps, ~300 MB at 1080p)
+RING_MAX_MB = 1024 # upper bound of a pre-trigger ring (1080p: ~170 frames)
+_END = object() # queue sentinel pushed by close()
+
+
+class FrameRing:
+    """
+    Fixed-size pre-trigger buffer: `capacity` frames of `shape` allocated once,
+    every push() copies into the oldest slot (no allocation per frame).
+    Capacity is clipped to RING_MAX_MB.
+    """
+    def __init__(self, capacity, shape):
+        frame_bytes = int(np.prod(shape))
+        self.capacity = max(1, min(int(capacity), RING_MAX_MB * 2 ** 20 // frame_bytes))
+        self.shape = tuple(shape)
+        self._frames = np.empty((self.capacity,) + self.shape, dtype=np.uint8)
+        self._next = 0 # slot of the next push
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, frame) -> bool:
+        # False (frame ignored) when the camera changed resolution
+        if frame.shape != self.shape:
+            return False
+        np.copyto(self._frames[self._next], frame)
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        return True
+
+    def frames(self):
+        # Views of the buffered frames, oldest first (valid until the next push)
+        first = (self._next - self._count) % self.capacity
+        for i in range(self._count):
+            yield self._frames[(first + i) % self.capacity]
+
+    def keep_last(self, n):
+        # Forget all but the newest n frames (no copy)
+        self._count = max(0, min(self._count, int(n)))
+
+    def clear(self):
+        self._next = self._count = 0
+
+
+class FrameEncoder:
+    """
+    Owns an opened cv2.VideoWriter: only the encoder thread writes to it and
+    releases it, after the last queued frame (no write racing the release on
+    stop, which broke the mp4 with "Invalid pts" / avcodec_send_frame errors).
+
+    push() never blocks: when the encoder is `queue_size` frames behind, the
+    frame is dropped and counted. `preroll` (a FrameRing, no longer pushed to)
+    is written before the queued frames; `on_frame(frame)` is called after each
+    written frame, so its consumer sees exactly the frames of the file.
+
+    Usage (capture thread):
+        enc = FrameEncoder(writer); enc.start()
+        enc.push(frame)       # True when the frame will be written
+        stats = enc.close()   # any thread: drain, release, counters
+    """
+    def __init__(self, writer, queue_size=ENCODER_QUEUE, preroll=None, on_frame=None):
+        self.writer = writer
+        self.preroll = preroll
+        self.on_frame = on_frame
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.max_backlog = 0 # deepest queue seen (encoder lag in frames)
+        self.error = None
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._lock = threading.Lock() # push vs close: no frame after the sentinel
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="frame-encoder", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def push(self, frame) -> bool:
+        # Capture thread: queue one frame; False when dropped (queue full or closed)
+        with self._lock:
+            if self._closed:
+                return False
+            try:
+                self._queue.put_nowait(frame)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.queued += 1
+            self.max_backlog = max(self.max_backlog, self._queue.qsize())
+        return True
+
+    def close(self, timeout=None) -> dict:
+        """
+        Stop accepting frames, write the queued ones and release the writer.
+        returns: stats() plus the seconds spent draining the queue (close_s)
+        """
+        t = time.perf_counter()
+        with self._lock:
+            first = not self._closed
+            self._closed = True
+        if first:
+            self._queue.put(_END) # blocking: the encoder thread always drains
+        self._thread.join(timeout)
+        return dict(self.stats(), close_s=round(time.perf_counter() - t, 3))
+
+    def stats(self) -> dict:
+        return {
+            "preroll": len(self.preroll) if self.preroll is not None else 0,
+            "queued": self.queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "max_backlog": self.max_backlog,
+            "error": None if self.error is None else str(self.error),
+        }
+
+    def _write(self, frame):
+        if self.error is not None:
+            return # encoder broken: keep draining so push/close never block
+        try:
+            self.writer.write(frame)
+        except Exception as exc: # cv2.error from the FFmpeg backend
+            self.error = exc
+            print(f"[WARN] Encoder stopped: {exc}")
+            return
+        self.written += 1
+        if self.on_frame is not None:
+            self.on_frame(frame)
+
+    def _run(self):
+        try:
+            if self.preroll is not None:
+                for frame in self.preroll.frames():
+                    self._write(frame)
+            while True:
+                frame = self._queue.get()
+                if frame is _END:
+                    break
+                self._write(frame)
+        finally:
+            self.writer.release()
+
+
+class LatestFrame:
+    """
+    One-slot mailbox between the capture loop and a slower consumer (the
+    live preview): put() replaces an unread frame instead of queueing it
+    (counted in `dropped`), take() returns the newest frame.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._cond.notify()
+
+    def take(self, timeout=None):
+        # Newest unread frame, or None if none arrived within `timeout`
+        with self._cond:
+            if self._frame is None:
+                self._cond.wait(timeout)
+            frame, self._frame = self._frame, None
+            return frame
@@ -0,0 +1,135 @@
+'''
+Overlay video rendering
+Draws the detections of disk_tracks.csv on the original recording, on demand
+and separately from the analysis (which never encodes video)
+
+'''
+
+import argparse
+import math
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+import Post_process as ptp
+import profiler as prf
+import tracks as trk
+
+PX_COLS = ["frame", "cx_px", "cy_px", "mx_px", "my_px", "r_px"]
+
+
+def draw_detections(frame, rows, scale: float = 1.0):
+    # Drawing (disk & marker) for the CSV rows of one frame, coordinates multiplied by `scale`
+    for cx, cy, mx, my, r in rows:
+        cv2.circle(frame, (int(cx * scale), int(cy * scale)), int(r * scale), (0, 255, 0), 2)
+        cv2.circle(frame, (int(cx * scale), int(cy * scale)), 4, (0, 0, 255), -1)
+        if not (math.isnan(mx) or math.isnan(my)):
+            cv2.circle(frame, (int(mx * scale), int(my * scale)), 4, (0, 0, 255), -1)
+
+
+def render_overlay(
+    video_path,
+    csv_path,
+    output_path,
+    fps: Optional[float] = None,
+    scale: float = 1.0,
+    step: int = 1,
+    around_collision: Optional[float] = None,
+    prof=prf.NULL_PROFILER,
+) -> int:
+    """
+    Render the detection overlay video from the recording and its disk_tracks.csv.
+
+    Args:
+      video_path:       Original recording.
+      csv_path:         disk_tracks.csv/.npz written by detector.main (needs the *_px columns).
+      output_path:      Overlay video (mp4v).
+      fps:              Playback fps of the output before decimation (None -> the recording's fps).
+      scale:            Output resolution factor (e.g. 0.5 for half width/height).
+      step:             Keep one frame out of every `step` (frame decimation).
+      around_collision: If set, only render ± this many seconds around the collision frame.
+      prof:             profiler.StageProfiler timing the "overlay_decode", "draw" and "encode" stages.
+
+    Returns:
+      Number of frames written.
+    """
+    if not 0 < scale <= 1:
+        raise ValueError(f"Overlay scale must be in (0, 1] ({scale}).")
+    step = max(1, int(step))
+
+    df = trk.read_tracks(csv_path)
+    missing = [c for c in PX_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Track file missing columns: {missing}")
+    rows_by_frame = {
+        int(f): g[["cx_px", "cy_px", "mx_px", "my_px", "r_px"]].to_numpy(dtype=float)
+        for f, g in df.groupby("frame")
+    }
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    src_fps = fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+
+    # Frame range: whole video, or a window around the collision
+    start, stop = 0, None
+    if around_collision is not None:
+        cf = ptp.collision_frame(csv_path)
+        half = int(round(around_collision * src_fps))
+        start, stop = max(cf - half, 0), cf + half + 1
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    outp = Path(output_path)
+    outp.parent.mkdir(parents=True, exist_ok=True)
+    out = cv2.VideoWriter(str(outp), cv2.VideoWriter_fourcc(*"mp4v"), src_fps / step, size)
+    if not out.isOpened():
+        cap.release()
+        raise IOError(f"Cannot open video writer {outp}")
+
+    written = 0
+    frame_idx = start
+    empty = np.empty((0, 5))
+    try:
+        while stop is None or frame_idx < stop:
+            # Decimated frames are only grabbed, never converted or drawn
+            keep = (frame_idx - start) % step == 0
+            with prof.stage("overlay_decode"):
+                ok = cap.grab()
+                if ok and keep:
+                    ok, frame = cap.retrieve()
+            if not ok:
+                break
+            if keep:
+                with prof.stage("draw"):
+                    if scale != 1:
+                        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    draw_detections(frame, rows_by_frame.get(frame_idx, empty), scale)
+                with prof.stage("encode"):
+                    out.write(frame)
+                written += 1
+            frame_idx += 1
+    finally:
+        cap.release()
+        out.release()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the detection overlay from disk_tracks.csv")
+    parser.add_argument("video", help="original recording")
+    parser.add_argument("csv", help="disk_tracks.csv")
+    parser.add_argument("output", help="overlay video (mp4)")
+    parser.add_argument("--fps", type=float, default=None, help="playback fps (default: recording fps)")
+    parser.add_argument("--scale", type=float, default=1.0, help="output resolution factor")
+    parser.add_argument("--step", type=int, default=1, help="render one frame out of every STEP")
+    parser.add_argument("--around-collision", type=float, default=None, metavar="SECONDS",
+                        help="only render this many seconds before and after the collision")
+    args = parser.parse_args()
+    n = render_overlay(args.video, args.csv, args.output, args.fps, args.scale, args.step, args.around_collision)
+    print(f"[Done] Rendered {n} frames to {args.output}")
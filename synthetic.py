@@ -0,0 +1,213 @@
+'''
+Synthetic collision videos
+Renders two 80 mm disks with green/blue offset markers sliding and colliding
+on a textured table, together with their ground-truth trajectories and spins
+(benchmarks and accuracy checks without student recordings)
+
+'''
+
+import argparse
+import math
+from pathlib import Path
+from typing import Tuple
+
+import cv2
+import numpy as np
+import pandas as pd
+
+
+DISK_DIAMETER_MM = 80.0
+MARKER_OFFSET_MM = 22.0 # marker centre to disk centre
+MARKER_RADIUS_MM = 8.0
+DISK_BGR = (232, 232, 232)
+MARKER_BGR = ((0, 200, 0), (200, 60, 0)) # disk 0 green, disk 1 blue (inside the detector's HSV ranges)
+SHIFT = 4 # sub-pixel bits for cv2.circle
+
+TRUTH_COLUMNS = ["frame", "disk_id", "cx_px", "cy_px", "mx_px", "my_px", "theta_rad", "r_px", "visible"]
+
+
+def simulate_collision(
+    n_frames: int,
+    fps: float,
+    size: Tuple[int, int],
+    px_per_mm: float,
+    enter_seconds: float = 2.5,
+    speeds_mm_s: Tuple[float, float] = (400.0, 300.0),
+    impact_offset: float = 0.35,
+    masses: Tuple[float, float] = (0.0118, 0.0118),
+    restitution: float = 0.9,
+    spins_rad_s: Tuple[float, float] = (4.0, -3.0),
+    substeps: int = 8,
+) -> np.ndarray:
+    """
+    Frictionless planar motion of the two disks, one impulsive collision.
+
+    Disk 0 enters from the left and disk 1 from the right, both on the frame
+    border at `enter_seconds` (the frames before are a clean table for the
+    background). `impact_offset` is the perpendicular offset of the two paths
+    in disk diameters (0 = head-on, >= 1 = no contact). Spins are constant
+    (no tangential friction at contact).
+
+    returns: array (n_frames, 2, 3) of x_px, y_px, theta_rad per frame and disk
+    """
+    w, h = size
+    r = DISK_DIAMETER_MM / 2.0 * px_per_mm
+    v = np.array([speeds_mm_s[0], -speeds_mm_s[1]], dtype=float) * px_per_mm # px/s along x
+    dy = impact_offset * r # half of the path offset
+    t0 = enter_seconds
+
+    pos = np.array([[-r - v[0] * t0, h / 2.0 - dy], [w + r - v[1] * t0, h / 2.0 + dy]])
+    vel = np.array([[v[0], 0.0], [v[1], 0.0]])
+    inv_m = 1.0 / np.asarray(masses, dtype=float)
+    spins = np.asarray(spins_rad_s, dtype=float)
+
+    out = np.zeros((n_frames, 2, 3))
+    dt = 1.0 / (fps * substeps)
+    for i in range(n_frames):
+        t = i / fps
+        out[i, :, :2] = pos
+        out[i, :, 2] = spins * t
+        for _ in range(substeps):
+            pos += vel * dt
+            d = pos[1] - pos[0]
+            dist = math.hypot(*d)
+            if 0 < dist <= 2 * r:
+                n = d / dist
+                v_rel = float(np.dot(vel[1] - vel[0], n))
+                if v_rel < 0: # approaching
+                    j = -(1 + restitution) * v_rel / (inv_m[0] + inv_m[1])
+                    vel[0] -= j * inv_m[0] * n
+                    vel[1] += j * inv_m[1] * n
+    return out
+
+
+def _table_texture(size: Tuple[int, int], rng: np.random.Generator) -> np.ndarray:
+    # Grey-green table: low-frequency shading + fine grain
+    w, h = size
+    coarse = rng.normal(0, 1, (max(2, h // 64), max(2, w // 64))).astype(np.float32)
+    coarse = cv2.resize(coarse, (w, h), interpolation=cv2.INTER_CUBIC) * 10
+    grain = cv2.GaussianBlur(rng.normal(0, 6, (h, w)).astype(np.float32), (3, 3), 0)
+    base = np.array([95, 110, 100], dtype=np.float32)
+    tex = base + (coarse + grain)[..., None]
+    return np.clip(tex, 0, 255).astype(np.uint8)
+
+
+def _draw_disks(img: np.ndarray, state: np.ndarray, r: float, m_off: float, m_r: float):
+    k = 1 << SHIFT
+    for disk_id, (x, y, theta) in enumerate(state):
+        cv2.circle(img, (int(round(x * k)), int(round(y * k))), int(round(r * k)), DISK_BGR, -1, cv2.LINE_AA, SHIFT)
+        mx, my = x + m_off * math.cos(theta), y + m_off * math.sin(theta)
+        cv2.circle(img, (int(round(mx * k)), int(round(my * k))), int(round(m_r * k)), MARKER_BGR[disk_id], -1, cv2.LINE_AA, SHIFT)
+
+
+def render_collision_video(
+    output_path,
+    width: int = 1920,
+    height: int = 1080,
+    fps: float = 30.0,
+    seconds: float = 6.0,
+    table_width_mm: float = 1000.0,
+    blur_samples: int = 1,
+    exposure: float = 0.5,
+    noise_sigma: float = 2.0,
+    seed: int = 0,
+    truth_path=None,
+    **motion,
+) -> pd.DataFrame:
+    """
+    Render a synthetic collision recording (mp4v) and its ground truth.
+
+    Args:
+      output_path:    Video to write.
+      width, height:  Resolution in pixels.
+      fps, seconds:   Frame rate and duration.
+      table_width_mm: Table width shown across the frame (sets px/mm).
+      blur_samples:   Sub-frame renders averaged per frame (motion blur, 1 = sharp).
+      exposure:       Fraction of the frame interval the shutter is open (motion blur length).
+      noise_sigma:    Gaussian sensor noise (grey levels).
+      seed:           Texture/noise seed (same seed -> same video).
+      truth_path:     Ground-truth CSV (None -> <video stem>_truth.csv next to the video).
+      **motion:       simulate_collision parameters (enter_seconds, speeds_mm_s,
+                      impact_offset, masses, restitution, spins_rad_s).
+
+    Returns:
+      Ground truth DataFrame (TRUTH_COLUMNS), also saved as CSV.
+    """
+    size = (int(width), int(height))
+    n_frames = int(round(seconds * fps))
+    px_per_mm = width / table_width_mm
+    r = DISK_DIAMETER_MM / 2.0 * px_per_mm
+    m_off, m_r = MARKER_OFFSET_MM * px_per_mm, MARKER_RADIUS_MM * px_per_mm
+
+    # Simulated on the sub-frame grid so blurred frames integrate the real motion
+    blur_samples = max(1, int(blur_samples))
+    sub = simulate_collision(n_frames * blur_samples, fps * blur_samples, size, px_per_mm, **motion)
+    truth = sub[::blur_samples]
+
+    rng = np.random.default_rng(seed)
+    table = _table_texture(size, rng)
+    cv2.setRNGSeed(seed) # sensor noise (cv2.randn is much faster than numpy at 1080p)
+
+    outp = Path(output_path)
+    outp.parent.mkdir(parents=True, exist_ok=True)
+    writer = cv2.VideoWriter(str(outp), cv2.VideoWriter_fourcc(*"mp4v"), float(fps), size)
+    if not writer.isOpened():
+        raise IOError(f"Cannot open video writer {outp}")
+
+    acc = np.empty((height, width, 3), dtype=np.float32)
+    noise = np.empty((height, width, 3), dtype=np.int16)
+    try:
+        for i in range(n_frames):
+            # Shutter open over the first `exposure` of the interval
+            if blur_samples == 1:
+                frame = table.copy()
+                _draw_disks(frame, truth[i], r, m_off, m_r)
+            else:
+                acc[:] = 0
+                for s in range(blur_samples):
+                    k = i * blur_samples + min(int(s * exposure), blur_samples - 1)
+                    img = table.copy()
+                    _draw_disks(img, sub[k], r, m_off, m_r)
+                    cv2.accumulate(img, acc)
+                frame = cv2.convertScaleAbs(acc, alpha=1.0 / blur_samples)
+            if noise_sigma > 0:
+                cv2.randn(noise, 0, noise_sigma)
+                frame = cv2.add(frame, noise, dtype=cv2.CV_8U)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    # Ground truth (marker = centre + offset at the disk's angle)
+    rows = []
+    for i in range(n_frames):
+        for disk_id, (x, y, theta) in enumerate(truth[i]):
+            visible = r <= x <= width - r and r <= y <= height - r
+            rows.append([i, disk_id, x, y, x + m_off * math.cos(theta), y + m_off * math.sin(theta), theta, r, visible])
+    df = pd.DataFrame(rows, columns=TRUTH_COLUMNS)
+    truth_path = Path(truth_path) if truth_path is not None else outp.with_name(f"{outp.stem}_truth.csv")
+    df.to_csv(truth_path, index=False)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a synthetic two-disk collision video with ground truth")
+    parser.add_argument("output", help="video to write (mp4)")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--seconds", type=float, default=6.0)
+    parser.add_argument("--blur", type=int, default=1, metavar="SAMPLES", help="sub-frame renders per frame (motion blur)")
+    parser.add_argument("--noise", type=float, default=2.0, help="sensor noise sigma")
+    parser.add_argument("--speeds", type=float, nargs=2, default=(400.0, 300.0), metavar=("V0", "V1"), help="mm/s")
+    parser.add_argument("--spins", type=float, nargs=2, default=(4.0, -3.0), metavar=("W0", "W1"), help="rad/s")
+    parser.add_argument("--offset", type=float, default=0.35, help="impact offset in disk diameters")
+    parser.add_argument("--restitution", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    df = render_collision_video(
+        args.output, args.width, args.height, args.fps, args.seconds,
+        blur_samples=args.blur, noise_sigma=args.noise, seed=args.seed,
+        speeds_mm_s=tuple(args.speeds), spins_rad_s=tuple(args.spins),
+        impact_offset=args.offset, restitution=args.restitution,
+    )
+    print(f"[Done] {df['frame'].nunique()} frames to {args.output}")
@@ -0,0 +1,241 @@
+'''
+Multi-disk tracker
+Stable IDs for any number of disks: a constant-velocity Kalman filter per
+disk and one optimal (Hungarian) assignment per frame on a cost combining the
+marker colour and the predicted position
+
+'''
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try: # optional: scipy's assignment solver (C); the numpy version below gives the same matching
+    from scipy.optimize import linear_sum_assignment as _scipy_lsa
+except ImportError:
+    _scipy_lsa = None
+
+
+GATE_CHI2 = 13.8 # 99.9% gate of the squared Mahalanobis distance (2 dof)
+COLOR_MATCH = 0.0 # cost added for a detection whose marker colour is the track's colour
+COLOR_UNKNOWN = 4.0 # no marker found: position alone decides
+COLOR_CONFLICT = 1e6 # marker of another track's colour: never matched
+NO_MATCH = 1e3 # cost of leaving a track or detection unassigned (above any gated pair)
+BIG = 1e9
+
+
+def linear_sum_assignment(cost) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Minimum-cost matching of a rectangular cost matrix (rows, cols sorted by
+    row), same contract as scipy.optimize.linear_sum_assignment. Uses scipy
+    when installed, else the O(n^3) Hungarian algorithm (potentials + shortest
+    augmenting paths) vectorised over the columns.
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    if _scipy_lsa is not None:
+        return _scipy_lsa(cost)
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = _hungarian(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+    return _hungarian(cost)
+
+
+def _hungarian(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # n <= m; 1-based potentials u (rows), v (cols); p[j] = row matched to column j
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            cand = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(cand)) + 1
+            delta = cand[j1 - 1]
+            used_cols = np.nonzero(used)[0]
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+class _Track:
+    # Constant-velocity Kalman filter on (x, y, vx, vy), pixels and pixels/frame
+    F = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=float)
+    H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=float)
+
+    def __init__(self, center, radius, meas_sigma, accel_sigma):
+        self.x = np.array([center[0], center[1], 0.0, 0.0])
+        self.P = np.diag([meas_sigma ** 2, meas_sigma ** 2, (4 * radius) ** 2, (4 * radius) ** 2])
+        self.radius = radius
+        q = accel_sigma ** 2 # white acceleration noise, dt = 1 frame
+        self.Q = q * np.array([[.25, 0, .5, 0], [0, .25, 0, .5], [.5, 0, 1, 0], [0, .5, 0, 1]])
+        self.R = np.eye(2) * meas_sigma ** 2
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def innovation(self):
+        # Predicted centre and inverse innovation covariance
+        S = self.H @ self.P @ self.H.T + self.R
+        return self.x[:2], np.linalg.inv(S)
+
+    def update(self, center, radius):
+        z = np.asarray(center, dtype=float)
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.H @ self.x)
+        self.P = (np.eye(4) - K @ self.H) @ self.P
+        self.radius = radius
+
+
+class MultiDiskTracker:
+    """
+    Drop-in replacement of detector.IDAssigner for N disks:
+      1) every track (one per colour of `color_id_map`) is predicted with its
+         constant-velocity Kalman filter
+      2) cost[track, detection] = squared Mahalanobis distance to the
+         prediction (gated) + colour term (same colour / no marker / other
+         colour); tracks never seen yet only use the colour and a left-to-right
+         tie-break, like IDAssigner
+      3) one Hungarian assignment of the known tracks x (detections + "unassigned")
+      4) a known track still unmatched takes the nearest unassigned detection
+         without a marker colour, even outside the gate (velocity jumps and
+         blurred markers around the collision)
+      5) tracks never seen yet: a second assignment on the detections left
+         (so a known disk whose marker was missed keeps its id)
+      6) matched tracks are updated with the measured centre
+    Extra (false) detections of another track's colour stay unassigned; cost
+    is O((T + D)^3) per frame.
+    """
+    def __init__(self, color_id_map: Dict[str, int], meas_sigma: float = 2.0, accel_sigma: float = 3.0):
+        self.color_id_map = {k.lower(): v for k, v in color_id_map.items()}
+        self.ids = sorted(set(self.color_id_map.values()))
+        self.meas_sigma = meas_sigma
+        self.accel_sigma = accel_sigma
+        self.tracks: Dict[int, _Track] = {}
+        self.last_ids = set() # ids assigned on the last frame
+
+    def _cost(self, ids, detections) -> np.ndarray:
+        n_t, n_d = len(ids), len(detections)
+        cost = np.zeros((n_t, n_d))
+        centers = np.array([d["center"] for d in detections], dtype=float).reshape(n_d, 2)
+        det_ids = [self.color_id_map.get((d.get("marker_color") or "").lower()) for d in detections]
+
+        # Position: gated squared Mahalanobis distance to the prediction
+        x_rank = np.argsort(np.argsort(centers[:, 0])) if n_d else np.zeros(0)
+        new_rank = 0
+        for t, pid in enumerate(ids):
+            trk = self.tracks.get(pid)
+            if trk is None:
+                # Never seen: left-to-right order of detections vs ascending ids (IDAssigner fallback)
+                cost[t] = 1e-3 * np.abs(x_rank - new_rank)
+                new_rank += 1
+                continue
+            pred, S_inv = trk.innovation()
+            d = centers - pred
+            m2 = np.einsum("ni,ij,nj->n", d, S_inv, d)
+            cost[t] = np.where(m2 <= GATE_CHI2, m2, NO_MATCH * 2)
+
+        # Colour evidence
+        for j, did in enumerate(det_ids):
+            if did is None:
+                cost[:, j] += COLOR_UNKNOWN
+            else:
+                # Own colour always wins however far (as IDAssigner); position only breaks ties between
+                # two detections of the same colour (a false positive)
+                same = np.array([pid == did for pid in ids])
+                cost[same, j] = COLOR_MATCH + 1e-6 * cost[same, j]
+                cost[~same, j] += COLOR_CONFLICT
+        return cost
+
+    def assign(self, detections) -> List[Tuple[int, dict]]:
+        """
+        detections: list of dicts with center, radius, marker_center, marker_color
+        returns: list of (assigned_id, detection_dict) sorted by id
+        """
+        for trk in self.tracks.values():
+            trk.predict()
+
+        # Known tracks first, then the never-seen ones on what is left (IDAssigner steps 2 and 3):
+        # a known disk whose marker was missed is never handed to an unseen id
+        assigned = {}
+        known = [pid for pid in self.ids if pid in self.tracks]
+        self._match(known, detections, assigned)
+        self._assign_outside_gate(detections, assigned)
+        taken = {id(d) for d in assigned.values()}
+        unseen = [pid for pid in self.ids if pid not in self.tracks]
+        self._match(unseen, [d for d in detections if id(d) not in taken], assigned)
+
+        for pid, d in assigned.items():
+            trk = self.tracks.get(pid)
+            if trk is None:
+                self.tracks[pid] = _Track(d["center"], d["radius"], self.meas_sigma, self.accel_sigma)
+            else:
+                trk.update(d["center"], d["radius"])
+        self.last_ids = set(assigned)
+        return [(pid, assigned[pid]) for pid in sorted(assigned)]
+
+    def _match(self, ids, detections, assigned):
+        # One Hungarian assignment of ids x (detections + one "unassigned" slot per track)
+        if not ids or not detections:
+            return
+        n_t, n_d = len(ids), len(detections)
+        full = np.full((n_t, n_d + n_t), BIG)
+        full[:, :n_d] = self._cost(ids, detections)
+        full[np.arange(n_t), n_d + np.arange(n_t)] = NO_MATCH
+        rows, cols = linear_sum_assignment(full)
+        for t, j in zip(rows, cols):
+            if j < n_d and full[t, j] < NO_MATCH:
+                assigned[ids[t]] = detections[j]
+
+    def _assign_outside_gate(self, detections, assigned):
+        # Gate fallback (as IDAssigner): a known track left unmatched takes the nearest
+        # unassigned detection without a marker colour, however far from the prediction
+        taken = {id(d) for d in assigned.values()}
+        free = [d for d in detections if id(d) not in taken
+                and self.color_id_map.get((d.get("marker_color") or "").lower()) is None]
+        for pid in self.ids:
+            trk = self.tracks.get(pid)
+            if pid in assigned or trk is None or not free:
+                continue
+            d = min(free, key=lambda d: np.hypot(*(np.asarray(d["center"], dtype=float) - trk.x[:2])))
+            assigned[pid] = d
+            free.remove(d)
+
+    def predict(self):
+        """
+        Guess for the next frame of every ID assigned on the last frame.
+        returns: list of (x, y, radius) in pixels
+        """
+        preds = []
+        for pid in sorted(self.last_ids):
+            trk = self.tracks[pid]
+            x, y = (trk.F @ trk.x)[:2]
+            preds.append((float(x), float(y), trk.radius))
+        return preds
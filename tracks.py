@@ -0,0 +1,187 @@
+'''
+Track output
+Writers that stream detector rows to disk as they are produced (constant
+memory) and a reader returning the same DataFrame for every format
+
+'''
+
+import abc
+import csv
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Column -> dtype of the binary (.npz) format; marker_color is stored as int8
+# codes into the "marker_color_names" array (-1 = no marker)
+NPZ_DTYPES = {
+    "frame": np.int32,
+    "disk_id": np.int16,
+    "cx_mm": np.float64,
+    "cy_mm": np.float64,
+    "mx_mm": np.float64,
+    "my_mm": np.float64,
+    "r_px": np.float64,
+    "marker_color": np.int8,
+    "cx_px": np.float64,
+    "cy_px": np.float64,
+    "mx_px": np.float64,
+    "my_px": np.float64,
+}
+COLOR_NAMES_KEY = "marker_color_names"
+
+
+class TrackWriter(abc.ABC):
+    """
+    Base writer: rows are lists in `columns` order, None for missing values.
+    Usable as a context manager; close() finalises the file.
+    """
+    def __init__(self, path, columns):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.count = 0
+
+    @abc.abstractmethod
+    def write_row(self, row):
+        ...
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvTrackWriter(TrackWriter):
+    # disk_tracks.csv, flushed every `flush_rows` rows
+    def __init__(self, path, columns, flush_rows: int = 256):
+        super().__init__(path, columns)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+        self._flush_rows = flush_rows
+
+    def write_row(self, row):
+        self._writer.writerow(row)
+        self.count += 1
+        if self.count % self._flush_rows == 0:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class NpzTrackWriter(TrackWriter):
+    """
+    Typed columnar .npz (one .npy per column, NPZ_DTYPES). Rows are buffered
+    in blocks of `block_rows`, each block is appended to a per-column spill
+    file, and close() streams the spills into the zip. RAM stays at one block.
+    """
+    def __init__(self, path, columns, block_rows: int = 4096):
+        super().__init__(path, columns)
+        missing = [c for c in self.columns if c not in NPZ_DTYPES]
+        if missing:
+            raise ValueError(f"No binary type for columns: {missing}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._block_rows = block_rows
+        self._block = []
+        self._spills = {c: tempfile.TemporaryFile() for c in self.columns}
+        self._color_codes = {} # name -> code
+        self._closed = False
+
+    def write_row(self, row):
+        self._block.append(row)
+        self.count += 1
+        if len(self._block) >= self._block_rows:
+            self._flush_block()
+
+    def _flush_block(self):
+        if not self._block:
+            return
+        for i, col in enumerate(self.columns):
+            values = [r[i] for r in self._block]
+            if col == "marker_color":
+                values = [-1 if v is None else self._color_codes.setdefault(v, len(self._color_codes)) for v in values]
+            elif np.issubdtype(NPZ_DTYPES[col], np.floating):
+                values = [np.nan if v is None else v for v in values]
+            np.asarray(values, dtype=NPZ_DTYPES[col]).tofile(self._spills[col])
+        self._block = []
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_block()
+
+        names = np.array(sorted(self._color_codes, key=self._color_codes.get), dtype=str)
+        with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for col in self.columns:
+                spill = self._spills[col]
+                dtype = np.dtype(NPZ_DTYPES[col])
+                header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (self.count,)}
+                with zf.open(col + ".npy", "w", force_zip64=True) as f:
+                    np.lib.format.write_array_header_1_0(f, header)
+                    spill.seek(0)
+                    shutil.copyfileobj(spill, f)
+                spill.close()
+            with zf.open(COLOR_NAMES_KEY + ".npy", "w") as f:
+                np.lib.format.write_array(f, names, allow_pickle=False)
+
+
+class MultiTrackWriter(TrackWriter):
+    # Same rows to several writers (e.g. CSV for students + .npz for post-processing)
+    def __init__(self, writers):
+        super().__init__(writers[0].path, writers[0].columns)
+        self.writers = writers
+
+    def write_row(self, row):
+        for w in self.writers:
+            w.write_row(row)
+        self.count += 1
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+
+
+def open_track_writer(path, columns) -> TrackWriter:
+    # Writer chosen by suffix: .csv or .npz
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return CsvTrackWriter(path, columns)
+    if suffix == ".npz":
+        return NpzTrackWriter(path, columns)
+    raise ValueError(f"Unknown track format: {path}")
+
+
+def read_tracks(path) -> pd.DataFrame:
+    """
+    Load a track file (.csv or .npz) as a DataFrame with the CSV's columns;
+    missing values are NaN and marker_color holds the colour names.
+    """
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(p.resolve())
+    if p.suffix.lower() != ".npz":
+        return pd.read_csv(p)
+
+    with np.load(p, allow_pickle=False) as data:
+        names = data[COLOR_NAMES_KEY] if COLOR_NAMES_KEY in data.files else np.array([], dtype=str)
+        cols = {}
+        for key in data.files:
+            if key == COLOR_NAMES_KEY:
+                continue
+            values = data[key]
+            if key == "marker_color":
+                values = pd.Categorical.from_codes(values, categories=list(names)).astype(object)
+            cols[key] = values
+    return pd.DataFrame(cols)